@@ -0,0 +1,79 @@
+"""Shared boto3 clients
+
+One registry for every module instead of a boto3.client(...) per module at
+import time. Clients are created on first use and cached per (service,
+region, thread), each thread with its own session since sessions are not
+thread safe. A forked child starts over rather than sharing the parent's
+connections. Pool size and keep-alive are set through configure().
+
+    import aws_clients
+    s3_client = aws_clients.client('s3')
+"""
+
+import os
+import threading
+
+settings = {
+    'max_pool_connections': 50,
+    'tcp_keepalive': True,
+    'connect_timeout': 10,
+    'read_timeout': 60,
+    'retries': {'max_attempts': 5, 'mode': 'adaptive'},
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+_generation = 0
+
+
+def configure(**kwargs):
+    """Update client settings, clients created afterwards pick them up."""
+    global _generation
+    with _lock:
+        settings.update(kwargs)
+        _generation += 1
+
+
+def _cache():
+    # per thread cache, dropped whenever the settings change or in a forked
+    # child, which would otherwise share the parent's pooled sockets
+    if getattr(_local, 'generation', None) != (os.getpid(), _generation):
+        import boto3  # deferred, boto3 is slow to import
+        _local.generation = (os.getpid(), _generation)
+        _local.session = boto3.session.Session()
+        _local.clients = {}
+    return _local.clients
+
+
+def _make_config(overrides):
+    from botocore.config import Config
+
+    with _lock:
+        options = dict(settings)
+    options.update(overrides)
+    return Config(**options)
+
+
+def client(service, region=None, **overrides):
+    """boto3 client for service/region, `overrides` are extra botocore Config options."""
+    clients = _cache()
+    key = ('client', service, region, repr(sorted(overrides.items())))
+    if key not in clients:
+        clients[key] = _local.session.client(
+            service, region_name=region, config=_make_config(overrides),
+        )
+    return clients[key]
+
+
+def resource(service, region=None, **overrides):
+    clients = _cache()
+    key = ('resource', service, region, repr(sorted(overrides.items())))
+    if key not in clients:
+        clients[key] = _local.session.resource(
+            service, region_name=region, config=_make_config(overrides),
+        )
+    return clients[key]
+
+
+def clear():
+    configure()
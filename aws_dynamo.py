@@ -0,0 +1,799 @@
+"""DynamoDB helpers
+
+Reusable DynamoDB functions for the key/text table in aws_sdk_dynamo.py.
+"""
+
+import base64
+import copy
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import aws_clients
+import aws_parallel
+import aws_s3
+
+KEY_SCHEMA = [
+    {'AttributeName': 'key', 'KeyType': 'HASH'},  # Partition key
+    {'AttributeName': 'text', 'KeyType': 'RANGE'},  # Sort key
+]
+
+ATTRIBUTE_DEFINITIONS = [
+    {'AttributeName': 'key', 'AttributeType': 'N'},
+    {'AttributeName': 'text', 'AttributeType': 'S'},
+]
+
+
+def create_table(table_name, read_capacity=10, write_capacity=10):
+    dy_res = aws_clients.resource('dynamodb')
+    return dy_res.create_table(
+        TableName=table_name,
+        KeySchema=KEY_SCHEMA,
+        AttributeDefinitions=ATTRIBUTE_DEFINITIONS,
+        ProvisionedThroughput={
+            'ReadCapacityUnits': read_capacity,
+            'WriteCapacityUnits': write_capacity,
+        },
+    )
+
+
+def get_table(table_name):
+    return aws_clients.resource('dynamodb').Table(table_name)
+
+
+def delete_table(table_name):
+    aws_clients.client('dynamodb').delete_table(TableName=table_name)
+
+
+# --- BATCH WRITE ---
+
+# batch_write_item takes up to 25 puts/deletes per request, unprocessed items
+# are resubmitted with exponential backoff and jitter
+
+MAX_BATCH_WRITE = 25
+
+
+def backoff(attempt, base=0.05, cap=5.0):
+    # full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def write_requests(puts=(), deletes=()):
+    for item in puts:
+        yield {'PutRequest': {'Item': item}}
+    for key in deletes:
+        yield {'DeleteRequest': {'Key': key}}
+
+
+def request_key(request):
+    if 'PutRequest' in request:
+        item = request['PutRequest']['Item']
+    else:
+        item = request['DeleteRequest']['Key']
+    return item['key'], item['text']
+
+
+def _write_batch(client, table_name, requests, max_retries):
+    from botocore.exceptions import ClientError
+
+    # a key twice in one request is rejected as a whole, the last request wins
+    requests = list({request_key(request): request for request in requests}.values())
+    request_items = {table_name: requests}
+    try:
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(backoff(attempt))
+            response = client.batch_write_item(RequestItems=request_items)
+            request_items = response.get('UnprocessedItems') or {}
+            if not request_items:
+                return len(requests), [], [], None
+    except ClientError as e:
+        # requests written by an earlier attempt are not in request_items any more
+        failed = request_items.get(table_name, [])
+        return len(requests) - len(failed), [], failed, str(e)
+    unprocessed = request_items.get(table_name, [])
+    return len(requests) - len(unprocessed), unprocessed, [], None
+
+
+def batch_write(table_name, puts=(), deletes=(), max_workers=4, max_retries=8, client=None):
+    """Write items and delete keys in 25 item batch_write_item calls run in parallel.
+
+    Takes plain python items (numbers as int or Decimal). Returns
+    {'written', 'unprocessed', 'failed', 'errors', 'seconds', 'items_per_sec'},
+    where unprocessed holds the requests still unprocessed after
+    `max_retries` resubmits and failed the requests of batches rejected with
+    an error, whose messages are in errors. Within a batch of 25 requests
+    only the last one for a key is sent.
+    """
+    # the resource's client converts python types to and from the wire format
+    client = client or aws_clients.resource('dynamodb').meta.client
+    result = {'written': 0, 'unprocessed': [], 'failed': [], 'errors': []}
+    start = time.perf_counter()
+    for written, unprocessed, failed, error in aws_parallel.map_bounded(
+        lambda batch: _write_batch(client, table_name, batch, max_retries),
+        aws_parallel.chunks(write_requests(puts, deletes), MAX_BATCH_WRITE),
+        max_workers,
+    ):
+        result['written'] += written
+        result['unprocessed'].extend(unprocessed)
+        result['failed'].extend(failed)
+        if error:
+            result['errors'].append(error)
+
+    result['seconds'] = time.perf_counter() - start
+    result['items_per_sec'] = result['written'] / result['seconds'] if result['seconds'] else 0.0
+    return result
+
+
+# --- BATCH GET ---
+
+# batch_get_item takes up to 100 keys per request, batches run in parallel
+# and their items are yielded as each batch completes
+
+MAX_BATCH_GET = 100
+
+
+def projection_kwargs(projection):
+    """ProjectionExpression kwargs from a list of attribute names.
+
+    Names go through ExpressionAttributeNames since `key` and `text` are
+    reserved words. A string is passed through as the expression, in
+    query_pages it can refer to them as #key and #text.
+    """
+    if not projection:
+        return {}
+    if isinstance(projection, str):
+        return {'ProjectionExpression': projection}
+    names = {f'#p{i}': name for i, name in enumerate(projection)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names,
+    }
+
+
+def _get_batch(client, table_name, keys, projection, consistent, max_retries):
+    request = {'Keys': keys, 'ConsistentRead': consistent, **projection_kwargs(projection)}
+    items = []
+    for attempt in range(max_retries + 1):
+        if attempt:
+            time.sleep(backoff(attempt))
+        response = client.batch_get_item(RequestItems={table_name: request})
+        items.extend(response['Responses'].get(table_name, []))
+        request = response.get('UnprocessedKeys', {}).get(table_name)
+        if not request:
+            return items, []
+    return items, request['Keys']
+
+
+def batch_get(
+    table_name, keys, projection=None, consistent=False, max_workers=4, max_retries=8, client=None,
+):
+    """Yield the items for an iterable of (key, text) pairs.
+
+    Keys are read in 100 key batch_get_item calls run in parallel and items
+    are yielded as batches complete, in no particular order. Missing keys
+    are skipped. Raises RuntimeError at the end if keys were still
+    unprocessed after `max_retries` resubmits.
+    """
+    client = client or aws_clients.resource('dynamodb').meta.client
+    unprocessed = []
+
+    def get(batch):
+        # duplicate keys in one request are rejected
+        unique = {(key, text): {'key': key, 'text': text} for key, text in batch}
+        return _get_batch(client, table_name, list(unique.values()), projection, consistent, max_retries)
+
+    for items, leftover in aws_parallel.map_bounded(get, aws_parallel.chunks(keys, MAX_BATCH_GET), max_workers):
+        unprocessed.extend(leftover)
+        yield from items
+
+    if unprocessed:
+        raise RuntimeError(f'{len(unprocessed)} keys still unprocessed after {max_retries} retries')
+
+
+# --- PARALLEL SCAN ---
+
+# each worker scans one Segment of TotalSegments following LastEvaluatedKey,
+# pages are handed over through a bounded queue so memory stays flat
+
+
+def scan_pages(table_name, segment=0, total_segments=1, projection=None, page_size=1000, client=None):
+    client = client or aws_clients.resource('dynamodb').meta.client
+    kwargs = {'TableName': table_name, 'Limit': page_size, **projection_kwargs(projection)}
+    if total_segments > 1:
+        kwargs.update(Segment=segment, TotalSegments=total_segments)
+    while True:
+        response = client.scan(**kwargs)
+        yield response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def iter_scan(table_name, total_segments=8, projection=None, page_size=1000, max_pages=16, client=None):
+    """Yield every item of the table, scanning `total_segments` segments in parallel."""
+    client = client or aws_clients.resource('dynamodb').meta.client
+
+    def pages(segment):
+        return scan_pages(table_name, segment, total_segments, projection, page_size, client)
+
+    return aws_parallel.iter_pages_parallel(pages, range(total_segments), total_segments, max_pages)
+
+
+def iter_scan_dataframes(table_name, chunk_size=10000, **kwargs):
+    return aws_s3.iter_dataframes(iter_scan(table_name, **kwargs), chunk_size)
+
+
+def _json_default(value):
+    # numbers keep their exact value, sets and binary become lists and base64
+    from boto3.dynamodb.types import Binary
+
+    if isinstance(value, Decimal):
+        if value == value.to_integral_value():
+            return int(value)
+        if Decimal(repr(float(value))) == value:
+            return float(value)
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, Binary):
+        value = value.value
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode()
+    raise TypeError(f'unsupported type {type(value).__name__}')
+
+
+def parquet_row(item):
+    """key and text as columns, every other attribute in one json column.
+
+    Items in a table share no schema beyond their keys, so the rest goes to
+    `attributes` instead of columns that would differ from chunk to chunk.
+    """
+    item = dict(item)
+    key = item.pop('key', None)
+    if key is not None and key != int(key):
+        raise ValueError(f'key {key} is not an integer')
+    return {
+        'key': None if key is None else int(key),
+        'text': item.pop('text', None),
+        'attributes': json.dumps(item, default=_json_default, sort_keys=True),
+    }
+
+
+def _scan_segment_to_parquet(table_name, segment, total_segments, path, chunk_size, projection, page_size):
+    # runs in a worker process, one parquet file per segment
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([('key', pa.int64()), ('text', pa.string()), ('attributes', pa.string())])
+    items = itertools.chain.from_iterable(
+        scan_pages(table_name, segment, total_segments, projection, page_size)
+    )
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        while True:
+            chunk = [parquet_row(item) for item in itertools.islice(items, chunk_size)]
+            if not chunk:
+                return rows
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            rows += len(chunk)
+
+
+def scan_to_parquet(
+    table_name, folder, total_segments=None, chunk_size=10000, projection=None, page_size=1000,
+):
+    """Export the table to folder/part-NNNN.parquet, one process per segment.
+
+    Deserialization is CPU bound, so segments run in processes to use every
+    core. Rows have key and text columns and the remaining attributes as a
+    json string, see parquet_row. Returns the number of rows written.
+    """
+    total_segments = total_segments or os.cpu_count()
+    os.makedirs(folder, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=min(total_segments, os.cpu_count())) as pool:
+        futures = [
+            pool.submit(
+                _scan_segment_to_parquet, table_name, segment, total_segments,
+                os.path.join(folder, f'part-{segment:04d}.parquet'), chunk_size, projection, page_size,
+            )
+            for segment in range(total_segments)
+        ]
+        return sum(future.result() for future in futures)
+
+
+# --- QUERY ---
+
+# key condition builders for the `text` range key, each returns the
+# condition expression and its values
+
+
+def begins_with(prefix):
+    return 'begins_with(#text, :text0)', {':text0': prefix}
+
+
+def between(low, high):
+    """Range keys from low to high, both inclusive."""
+    return '#text BETWEEN :text0 AND :text1', {':text0': low, ':text1': high}
+
+
+def query_pages(
+    table_name,
+    key,
+    condition=None,
+    projection=None,
+    page_size=1000,
+    consistent=False,
+    descending=False,
+    client=None,
+):
+    """Yield pages of items for hash key `key`, following LastEvaluatedKey.
+
+    `condition` is a builder result such as begins_with('ab'), without one
+    the whole partition is read. Each request returns at most `page_size`
+    items so memory stays bounded however large the partition is.
+    """
+    client = client or aws_clients.resource('dynamodb').meta.client
+    expression = '#key = :key'
+    names = {'#key': 'key'}
+    values = {':key': key}
+    if condition:
+        range_expression, range_values = condition
+        expression += ' AND ' + range_expression
+        names['#text'] = 'text'
+        values.update(range_values)
+    projection = projection_kwargs(projection)
+    if '#text' in projection.get('ProjectionExpression', ''):
+        names['#text'] = 'text'
+    names.update(projection.pop('ExpressionAttributeNames', {}))
+    kwargs = {
+        'TableName': table_name,
+        'KeyConditionExpression': expression,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ConsistentRead': consistent,
+        'ScanIndexForward': not descending,
+        'Limit': page_size,
+        **projection,
+    }
+    while True:
+        response = client.query(**kwargs)
+        yield response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def query(table_name, key, condition=None, max_items=None, **kwargs):
+    """Yield items for hash key `key` one at a time, see query_pages for the options."""
+    count = 0
+    for page in query_pages(table_name, key, condition, **kwargs):
+        for item in page:
+            if max_items is not None and count >= max_items:
+                return
+            yield item
+            count += 1
+
+
+# --- ITEM CACHE ---
+
+# serve hot get_item calls from memory, writes through the wrapper
+# invalidate (or refresh) the cached item
+
+
+class CachedTable:
+    """LRU + TTL read-through cache around a key/text table.
+
+    get_item is served from memory while the entry is fresh, missing items
+    are cached too. put_item, update_item and delete_item go to the table
+    and drop the cached entry, or with `refresh_on_write` replace it with
+    the written item. Consistent reads always go to the table. Each entry
+    remembers the read units its fetch consumed, which a hit saves.
+    """
+
+    def __init__(self, table_name, max_items=10000, ttl_seconds=60, refresh_on_write=False, table=None):
+        self.table = table or get_table(table_name)
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.refresh_on_write = refresh_on_write
+        self.lock = threading.Lock()
+        self.items = OrderedDict()  # (key, text) -> (item, read units, expires), least recent first
+        self.hits = 0
+        self.misses = 0
+        self.saved_read_units = 0.0
+        # reads in flight per key, and how often the key was written meanwhile
+        self.reading = {}
+        self.generations = {}
+
+    def _store(self, cache_key, item, units, generation=None):
+        with self.lock:
+            if generation is not None and self.generations.get(cache_key, 0) != generation:
+                # written while the read was in flight, the read may be stale
+                return
+            self.items.pop(cache_key, None)
+            self.items[cache_key] = (copy.deepcopy(item), units, time.monotonic() + self.ttl_seconds)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def invalidate(self, key, text):
+        cache_key = (key, text)
+        with self.lock:
+            self.items.pop(cache_key, None)
+            if cache_key in self.reading:
+                self.generations[cache_key] = self.generations.get(cache_key, 0) + 1
+
+    def get_item(self, key, text, consistent=False, **kwargs):
+        cache_key = (key, text)
+        # projections and other options would cache a partial item
+        cacheable = not set(kwargs) - {'ReturnConsumedCapacity'}
+        if not consistent and cacheable:
+            with self.lock:
+                entry = self.items.get(cache_key)
+                if entry and entry[2] > time.monotonic():
+                    self.items.move_to_end(cache_key)
+                    self.hits += 1
+                    self.saved_read_units += entry[1]
+                    # a copy, so callers can not change the cached item
+                    return copy.deepcopy(entry[0])
+        kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        with self.lock:
+            self.misses += 1
+            self.reading[cache_key] = self.reading.get(cache_key, 0) + 1
+            generation = self.generations.get(cache_key, 0)
+        try:
+            response = self.table.get_item(Key={'key': key, 'text': text}, ConsistentRead=consistent, **kwargs)
+            item = response.get('Item')
+            if cacheable:
+                units = response.get('ConsumedCapacity', {}).get('CapacityUnits', 0.5)
+                self._store(cache_key, item, units, generation)
+        finally:
+            with self.lock:
+                self.reading[cache_key] -= 1
+                if not self.reading[cache_key]:
+                    del self.reading[cache_key]
+                    self.generations.pop(cache_key, None)
+        return item
+
+    def put_item(self, item, **kwargs):
+        response = self.table.put_item(Item=item, **kwargs)
+        self.invalidate(item['key'], item['text'])
+        if self.refresh_on_write:
+            self._store((item['key'], item['text']), item, 0.5)
+        return response
+
+    def update_item(self, key, text, **kwargs):
+        # covers nested updates such as "set stuff.message=:r"
+        if self.refresh_on_write and 'ReturnValues' not in kwargs:
+            kwargs['ReturnValues'] = 'ALL_NEW'
+        response = self.table.update_item(Key={'key': key, 'text': text}, **kwargs)
+        self.invalidate(key, text)
+        if self.refresh_on_write and kwargs['ReturnValues'] == 'ALL_NEW':
+            self._store((key, text), response['Attributes'], 0.5)
+        return response
+
+    def delete_item(self, key, text, **kwargs):
+        response = self.table.delete_item(Key={'key': key, 'text': text}, **kwargs)
+        self.invalidate(key, text)
+        return response
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests if requests else 0.0,
+                'saved_read_units': self.saved_read_units,
+                'cached_items': len(self.items),
+            }
+
+
+# --- CAPACITY ---
+
+# every request through MeteredClient asks for ReturnConsumedCapacity, the
+# units are added up per table and operation and paid for from a token
+# bucket per table, so requests are paced below the provisioned throughput
+
+READ_OPERATIONS = {'get_item', 'batch_get_item', 'query', 'scan', 'transact_get_items'}
+WRITE_OPERATIONS = {'put_item', 'update_item', 'delete_item', 'batch_write_item', 'transact_write_items'}
+THROTTLE_CODES = {'ProvisionedThroughputExceededException', 'ThrottlingException'}
+
+
+class TokenBucket:
+    """Capacity units per second, cut back on throttling and recovered slowly.
+
+    acquire reserves units up front and sleeps until they are covered, charge
+    settles the difference once the actual consumption is known. The balance
+    may go negative, later callers then wait for the debt to be paid off.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, decrease=0.5, increase=0.05):
+        self.target = rate
+        self.rate = rate
+        self.burst = burst or rate
+        self.min_rate = min_rate or rate / 10
+        self.decrease = decrease
+        self.increase = increase
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, units=1.0):
+        with self.lock:
+            self._refill()
+            self.tokens -= units
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def charge(self, units):
+        with self.lock:
+            self.tokens -= units
+
+    def throttled(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.target, self.rate + self.target * self.increase)
+
+
+def _transact_tables(kwargs):
+    # every TransactItems entry is {'Get' | 'Put' | ...: {'TableName': ..., ...}}
+    return [action['TableName'] for entry in kwargs.get('TransactItems', []) for action in entry.values()]
+
+
+def request_tables(kwargs):
+    if 'TableName' in kwargs:
+        return [kwargs['TableName']]
+    if 'TransactItems' in kwargs:
+        return list(dict.fromkeys(_transact_tables(kwargs)))
+    return list(kwargs.get('RequestItems', {}))
+
+
+def estimate_units(operation, kwargs, table_name):
+    """Units to reserve before a request, the real cost is charged afterwards."""
+    if operation == 'batch_write_item':
+        return float(len(kwargs['RequestItems'][table_name]))
+    if operation == 'batch_get_item':
+        return 0.5 * len(kwargs['RequestItems'][table_name]['Keys'])
+    if operation in ('transact_get_items', 'transact_write_items'):
+        # transactions cost two units per item, reads are strongly consistent
+        return 2.0 * _transact_tables(kwargs).count(table_name)
+    if operation in WRITE_OPERATIONS:
+        return 1.0
+    return 1.0 if kwargs.get('ConsistentRead') else 0.5
+
+
+def consumed_units(response):
+    consumed = response.get('ConsumedCapacity') or []
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return {c['TableName']: c.get('CapacityUnits', 0.0) for c in consumed}
+
+
+class MeteredClient:
+    """DynamoDB client wrapper that meters and paces table operations.
+
+    Operations not in READ_OPERATIONS or WRITE_OPERATIONS pass straight
+    through. `capacity` maps table names to (read, write) units per second
+    and defaults to `read_capacity`/`write_capacity`; `headroom` keeps the
+    pace just under that. Throttled requests halve the table's rate and are
+    retried with backoff, successful ones win the rate back gradually. A
+    batch response with unprocessed entries counts as throttled too, the
+    entries are left for the caller to resubmit. The default client does
+    not retry by itself so every throttle reaches the limiter.
+
+        dy_client = aws_dynamo.MeteredClient(read_capacity=10, write_capacity=10)
+        aws_dynamo.batch_write(table_name, puts=items, client=dy_client)
+        dy_client.stats()
+    """
+
+    def __init__(self, client=None, read_capacity=10, write_capacity=10, capacity=None, headroom=0.9, max_retries=8):
+        # botocore would otherwise retry throttles out of sight of the limiter
+        self.client = client or aws_clients.resource(
+            'dynamodb', retries={'total_max_attempts': 1, 'mode': 'standard'},
+        ).meta.client
+        self.read_capacity = read_capacity
+        self.write_capacity = write_capacity
+        self.capacity = capacity or {}
+        self.headroom = headroom
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.buckets = {}  # (table, 'read' | 'write') -> TokenBucket
+        self.metrics = {}  # table -> operation -> counts
+
+    def bucket(self, table_name, kind):
+        with self.lock:
+            if (table_name, kind) not in self.buckets:
+                read, write = self.capacity.get(table_name, (self.read_capacity, self.write_capacity))
+                rate = (read if kind == 'read' else write) * self.headroom
+                self.buckets[table_name, kind] = TokenBucket(rate)
+            return self.buckets[table_name, kind]
+
+    def _record(self, table_name, operation, **counts):
+        with self.lock:
+            metrics = self.metrics.setdefault(table_name, {}).setdefault(
+                operation, {'calls': 0, 'units': 0.0, 'throttled': 0, 'wait_seconds': 0.0},
+            )
+            for name, value in counts.items():
+                metrics[name] += value
+
+    def __getattr__(self, name):
+        if name in READ_OPERATIONS or name in WRITE_OPERATIONS:
+            return lambda **kwargs: self.call(name, **kwargs)
+        return getattr(self.client, name)
+
+    def call(self, operation, **kwargs):
+        from botocore.exceptions import ClientError
+
+        kind = 'read' if operation in READ_OPERATIONS else 'write'
+        kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        tables = request_tables(kwargs)
+        for attempt in range(self.max_retries + 1):
+            reserved = {}
+            for table_name in tables:
+                reserved[table_name] = estimate_units(operation, kwargs, table_name)
+                wait = self.bucket(table_name, kind).acquire(reserved[table_name])
+                self._record(table_name, operation, wait_seconds=wait)
+            try:
+                response = getattr(self.client, operation)(**kwargs)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in THROTTLE_CODES or attempt == self.max_retries:
+                    raise
+                for table_name in tables:
+                    self.bucket(table_name, kind).throttled()
+                    self._record(table_name, operation, throttled=1)
+                time.sleep(backoff(attempt))
+                continue
+            consumed = consumed_units(response)
+            unprocessed = response.get('UnprocessedItems') or response.get('UnprocessedKeys') or {}
+            for table_name in tables:
+                units = consumed.get(table_name, reserved[table_name])
+                bucket = self.bucket(table_name, kind)
+                bucket.charge(units - reserved[table_name])
+                if unprocessed.get(table_name):
+                    bucket.throttled()
+                    self._record(table_name, operation, calls=1, units=units, throttled=1)
+                else:
+                    bucket.succeeded()
+                    self._record(table_name, operation, calls=1, units=units)
+            return response
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for table_name, operations in self.metrics.items():
+                stats[table_name] = {
+                    'operations': {op: dict(counts) for op, counts in operations.items()},
+                    'read_units': sum(c['units'] for op, c in operations.items() if op in READ_OPERATIONS),
+                    'write_units': sum(c['units'] for op, c in operations.items() if op in WRITE_OPERATIONS),
+                    'throttled': sum(c['throttled'] for c in operations.values()),
+                }
+                for kind in ('read', 'write'):
+                    if (table_name, kind) in self.buckets:
+                        stats[table_name][f'{kind}_rate'] = self.buckets[table_name, kind].rate
+            return stats
+
+
+# --- SHARDING ---
+
+# a hot logical key is spread over several physical partition keys,
+# key * SHARD_FACTOR + shard, picked from a hash of the range key so every
+# item still has exactly one home
+
+SHARD_FACTOR = 1000
+
+
+class ShardedTable:
+    """Key/text table whose partition keys are split into shards.
+
+    `shards` maps logical keys to their shard count, other keys get
+    `default_shards`. Items are written with their physical key and read
+    back with the logical one. Item operations go to the one shard holding
+    the item, query reads every shard of the key in parallel and merges
+    them in range key order. All keys, sharded or not, are stored in the
+    physical layout, and changing a key's shard count moves its items, so
+    existing items have to be rewritten.
+    """
+
+    def __init__(self, table_name, shards=None, default_shards=1, client=None):
+        self.table_name = table_name
+        self.shards = dict(shards or {})
+        self.default_shards = default_shards
+        self.client = client or aws_clients.resource('dynamodb').meta.client
+        for count in [default_shards, *self.shards.values()]:
+            if not 1 <= count <= SHARD_FACTOR:
+                raise ValueError(f'shard count must be between 1 and {SHARD_FACTOR}')
+
+    def shard_count(self, key):
+        return self.shards.get(key, self.default_shards)
+
+    def physical_key(self, key, text):
+        shard = zlib.crc32(text.encode()) % self.shard_count(key)
+        return key * SHARD_FACTOR + shard
+
+    def physical_keys(self, key):
+        return [key * SHARD_FACTOR + shard for shard in range(self.shard_count(key))]
+
+    def to_physical(self, item):
+        return {**item, 'key': self.physical_key(item['key'], item['text'])}
+
+    @staticmethod
+    def to_logical(item):
+        if item is None or 'key' not in item:
+            return item
+        # the resource client returns Decimal, whose // truncates toward zero
+        return {**item, 'key': int(item['key']) // SHARD_FACTOR}
+
+    def _key(self, key, text):
+        return {'key': self.physical_key(key, text), 'text': text}
+
+    def put_item(self, item, **kwargs):
+        return self.client.put_item(TableName=self.table_name, Item=self.to_physical(item), **kwargs)
+
+    def get_item(self, key, text, **kwargs):
+        response = self.client.get_item(TableName=self.table_name, Key=self._key(key, text), **kwargs)
+        return self.to_logical(response.get('Item'))
+
+    def update_item(self, key, text, **kwargs):
+        return self.client.update_item(TableName=self.table_name, Key=self._key(key, text), **kwargs)
+
+    def delete_item(self, key, text, **kwargs):
+        return self.client.delete_item(TableName=self.table_name, Key=self._key(key, text), **kwargs)
+
+    def batch_write(self, puts=(), deletes=(), **kwargs):
+        return batch_write(
+            self.table_name,
+            puts=(self.to_physical(item) for item in puts),
+            deletes=(self._key(key['key'], key['text']) for key in deletes),
+            client=self.client,
+            **kwargs,
+        )
+
+    def query(self, key, condition=None, max_items=None, prefetch_pages=2, **kwargs):
+        """Items of logical key `key` from all its shards, ordered by range key.
+
+        Takes the query_pages options. Every shard is read by its own thread
+        at most `prefetch_pages` pages ahead of the merge, so a large key is
+        streamed rather than loaded, `max_items` applies to the merge. The
+        projection always includes the key and range key.
+        """
+        projection = kwargs.get('projection')
+        # the merge orders by text and to_logical needs key
+        if isinstance(projection, str):
+            missing = [name for name in ('#key', '#text') if name not in projection]
+            kwargs['projection'] = ', '.join([projection, *missing])
+        elif projection:
+            missing = [name for name in ('key', 'text') if name not in projection]
+            kwargs['projection'] = [*projection, *missing]
+
+        def read(physical_key):
+            pages = query_pages(self.table_name, physical_key, condition, client=self.client, **kwargs)
+            for page in aws_parallel.prefetch(pages, prefetch_pages):
+                yield from page
+
+        readers = [read(physical_key) for physical_key in self.physical_keys(key)]
+        try:
+            merged = heapq.merge(*readers, key=lambda item: item['text'], reverse=kwargs.get('descending', False))
+            for item in itertools.islice(merged, max_items):
+                yield self.to_logical(item)
+        finally:
+            # stops the prefetching threads when the caller stops early
+            for reader in readers:
+                reader.close()
@@ -0,0 +1,131 @@
+"""DynamoDB item codec
+
+Converts between plain Python dicts and the DynamoDB wire format, for
+using the low level client (dy_client in aws_sdk_dynamo.py) directly
+instead of going through the resource layer's TypeSerializer and Decimal
+conversion.
+
+str, int, float, bool, None, dict and list are dispatched on their exact
+type; Decimal, bytes, sets and subclasses take the slower general path.
+Numbers come back as int when they have no fraction or exponent and as
+float otherwise, pass number=Decimal to decode them exactly.
+
+    dy_client.put_item(TableName=table_name, Item=aws_dynamo_codec.encode_item(item))
+    item = aws_dynamo_codec.decode_item(dy_client.get_item(TableName=table_name, Key=key)['Item'])
+"""
+
+import math
+from decimal import Decimal
+
+
+def _encode_float(value):
+    if not math.isfinite(value):
+        raise ValueError(f'{value} can not be stored in DynamoDB')
+    return {'N': repr(value)}
+
+
+def _encode_map(value):
+    for k in value:
+        if not isinstance(k, str):
+            raise TypeError(f'map keys must be str, not {type(k).__name__}')
+    return {'M': {k: encode(v) for k, v in value.items()}}
+
+
+def _encode_list(value):
+    return {'L': [encode(v) for v in value]}
+
+
+_ENCODERS = {
+    str: lambda value: {'S': value},
+    bool: lambda value: {'BOOL': value},
+    int: lambda value: {'N': str(value)},
+    float: _encode_float,
+    type(None): lambda value: {'NULL': True},
+    dict: _encode_map,
+    list: _encode_list,
+}
+
+
+def _encode_set(value):
+    if not value:
+        raise ValueError('empty sets can not be stored in DynamoDB')
+    if all(isinstance(v, str) for v in value):
+        return {'SS': list(value)}
+    if all(isinstance(v, (bytes, bytearray)) for v in value):
+        return {'BS': [bytes(v) for v in value]}
+    if all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in value):
+        return {'NS': [encode(v)['N'] for v in value]}
+    raise TypeError(f'unsupported set {value!r}')
+
+
+def _encode_other(value):
+    if isinstance(value, bool):
+        return {'BOOL': bool(value)}
+    if isinstance(value, str):
+        return {'S': str(value)}
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            raise ValueError(f'{value} can not be stored in DynamoDB')
+        return {'N': str(value)}
+    if isinstance(value, int):
+        return {'N': str(int(value))}
+    if isinstance(value, float):
+        return _encode_float(float(value))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'B': bytes(value)}
+    if isinstance(value, (set, frozenset)):
+        return _encode_set(value)
+    if isinstance(value, dict):
+        return _encode_map(value)
+    if isinstance(value, (list, tuple)):
+        return _encode_list(value)
+    raise TypeError(f'unsupported type {type(value).__name__}')
+
+
+def encode(value):
+    """Wire format for one attribute value, e.g. 'a' -> {'S': 'a'}."""
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        return _encode_other(value)
+    return encoder(value)
+
+
+def encode_item(item):
+    """Wire format for a whole item, usable as Item or Key with dy_client."""
+    return _encode_map(item)['M']
+
+
+def parse_number(text):
+    if '.' in text or 'e' in text or 'E' in text:
+        return float(text)
+    return int(text)
+
+
+def decode(value, number=parse_number):
+    """Python value for one wire format attribute value."""
+    (tag, data), = value.items()
+    if tag == 'S':
+        return data
+    if tag == 'N':
+        return number(data)
+    if tag == 'M':
+        return {k: decode(v, number) for k, v in data.items()}
+    if tag == 'L':
+        return [decode(v, number) for v in data]
+    if tag == 'BOOL':
+        return data
+    if tag == 'NULL':
+        return None
+    if tag == 'B':
+        return bytes(data)
+    if tag == 'SS':
+        return set(data)
+    if tag == 'NS':
+        return {number(v) for v in data}
+    if tag == 'BS':
+        return {bytes(v) for v in data}
+    raise TypeError(f'unsupported DynamoDB type {tag}')
+
+
+def decode_item(item, number=parse_number):
+    return {k: decode(v, number) for k, v in item.items()}
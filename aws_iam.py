@@ -1,10 +1,7 @@
 
 import json
 
-import boto3
-import pandas as pd
-
-iam_client = boto3.client('iam')
+import aws_clients
 
 # create assume role policy document
 EC2_ASSUME_ROLE = json.dumps({
@@ -26,6 +23,9 @@ def get_instance_profile(
     role='ec2_full_access_role', 
     policy='AmazonEC2FullAccess'
 ):
+    import pandas as pd
+
+    iam_client = aws_clients.client('iam')
 
     profiles = iam_client.list_instance_profiles()
     profile_df = pd.DataFrame(profiles['InstanceProfiles'])
@@ -66,6 +66,7 @@ def get_instance_profile(
 
 
 def remove_role(profile, role):
+    iam_client = aws_clients.client('iam')
     iam_client.remove_role_from_instance_profile(
         InstanceProfileName=profile,
         RoleName=role
@@ -73,6 +74,7 @@ def remove_role(profile, role):
 
 
 def detach_policy(role, policy):
+    iam_client = aws_clients.client('iam')
     iam_client.detach_role_policy(
         RoleName=role, 
         PolicyArn=policy
@@ -81,9 +83,11 @@ def detach_policy(role, policy):
 
 def delete_instance_profile(name):
     # TODO: update to auto remove roles
+    iam_client = aws_clients.client('iam')
     iam_client.delete_instance_profile(InstanceProfileName=name)
 
 
 def delete_role(name):
     # TODO: update to auto detach policies
+    iam_client = aws_clients.client('iam')
     iam_client.delete_role(RoleName=name)
@@ -0,0 +1,131 @@
+"""Thread pool helpers
+
+Shared by the S3 and DynamoDB modules for the shapes of parallel work
+they do: draining several paginated sources at once, reading one source
+ahead in the background, and pushing batches through a pool without
+reading the whole input ahead.
+"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def _put(handoff, stop, item):
+    # give up once the consumer has gone away so the producer can finish
+    while not stop.is_set():
+        try:
+            handoff.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def iter_pages_parallel(pages, sources, max_workers=8, max_pages=16):
+    """Yield the items of pages(source) for every source, one worker per source.
+
+    pages(source) returns an iterable of pages (lists of items). Pages are
+    handed over through a bounded queue so at most `max_pages` wait in
+    memory; items come out in no particular order. An exception in a worker
+    is raised here, and closing the generator early stops the workers.
+    """
+    sources = list(sources)
+    if not sources:
+        return
+    handoff = queue.Queue(maxsize=max_pages)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        _put(handoff, stop, item)
+
+    def worker(source):
+        try:
+            for page in pages(source):
+                if stop.is_set():
+                    return
+                put(page)
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for source in sources:
+            pool.submit(worker, source)
+        remaining = len(sources)
+        try:
+            while remaining:
+                item = handoff.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            stop.set()
+
+
+def prefetch(iterable, size=2):
+    """Yield the items of iterable, produced ahead by a background thread.
+
+    At most `size` items wait in memory. An exception in the thread is
+    raised here, and closing the generator early stops the thread.
+    """
+    handoff = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def worker():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                _put(handoff, stop, item)
+        except Exception as e:
+            _put(handoff, stop, e)
+        finally:
+            _put(handoff, stop, done)
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            item = handoff.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_bounded(func, batches, max_workers=8):
+    """Yield func(batch) for every batch as the calls complete.
+
+    At most 2 * `max_workers` batches are submitted but unfinished, so the
+    input is consumed only a little ahead of the pool.
+    """
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for batch in batches:
+            pending.add(pool.submit(func, batch))
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,664 @@
+"""S3 helpers
+
+Reusable S3 functions for the aws_sdk_s3* exploration scripts.
+"""
+
+import io
+import itertools
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import aws_clients
+import aws_parallel
+
+MB = 1024 ** 2
+
+# --- TRANSFER ---
+
+# https://boto3.amazonaws.com/v1/documentation/api/latest/reference/customizations/s3.html
+
+
+def get_transfer_config(part_size=8 * MB, max_concurrency=10):
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1,
+    )
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class TransferStats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = 0
+        self.bytes = 0
+        self.errors = 0
+        self.latencies = []
+        self.start = time.perf_counter()
+
+    def record(self, nbytes, seconds):
+        with self.lock:
+            self.objects += 1
+            self.bytes += nbytes
+            self.latencies.append(seconds)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.start
+            return {
+                'objects': self.objects,
+                'errors': self.errors,
+                'bytes': self.bytes,
+                'seconds': elapsed,
+                'mb_per_sec': self.bytes / MB / elapsed if elapsed else 0.0,
+                'latency_p50': percentile(self.latencies, 50),
+                'latency_p95': percentile(self.latencies, 95),
+                'latency_max': max(self.latencies, default=0.0),
+            }
+
+
+class TransferEngine:
+    """Multipart uploads/downloads over a shared thread pool.
+
+    Each object is split into `part_size` parts moved by up to
+    `max_concurrency` threads, and `max_workers` objects are in flight at
+    once. The client connection pool is sized to cover both.
+    """
+
+    def __init__(self, client=None, part_size=8 * MB, max_concurrency=10, max_workers=8):
+        if client is None:
+            pool_size = max(10, max_concurrency * max_workers)
+            client = aws_clients.client('s3', max_pool_connections=pool_size)
+        self.client = client
+        self.config = get_transfer_config(part_size, max_concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.stats = TransferStats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+    def reset_stats(self):
+        self.stats = TransferStats()
+
+    def upload_file(self, path, bucket, key):
+        start = time.perf_counter()
+        self.client.upload_file(path, bucket, key, Config=self.config)
+        self.stats.record(os.path.getsize(path), time.perf_counter() - start)
+        return key
+
+    def download_file(self, bucket, key, path):
+        start = time.perf_counter()
+        self.client.download_file(bucket, key, path, Config=self.config)
+        self.stats.record(os.path.getsize(path), time.perf_counter() - start)
+        return path
+
+    def _run(self, func, items):
+        """Returns (item, result or exception) for every item, in input order."""
+        items = list(items)
+        futures = [self.pool.submit(func, *item) for item in items]
+        outcomes = []
+        for item, future in zip(items, futures):
+            try:
+                outcomes.append((item, future.result()))
+            except Exception as e:
+                self.stats.record_error()
+                outcomes.append((item, e))
+        return outcomes
+
+    def upload_files(self, items):
+        # items: iterable of (path, bucket, key)
+        return self._run(self.upload_file, items)
+
+    def download_files(self, items):
+        # items: iterable of (bucket, key, path)
+        return self._run(self.download_file, items)
+
+
+# --- LIST ---
+
+# list_objects returns at most 1000 keys, follow ListObjectsV2 continuation
+# tokens through the paginator instead and yield as pages arrive
+
+
+def iter_pages(bucket, prefix='', delimiter=None, page_size=1000, client=None):
+    client = client or aws_clients.client('s3')
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    if delimiter:
+        kwargs['Delimiter'] = delimiter
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(**kwargs, PaginationConfig={'PageSize': page_size}):
+        yield page
+
+
+def iter_objects(bucket, prefix='', page_size=1000, client=None):
+    for page in iter_pages(bucket, prefix, page_size=page_size, client=client):
+        yield from page.get('Contents', [])
+
+
+def iter_keys(bucket, prefix='', page_size=1000, client=None):
+    for obj in iter_objects(bucket, prefix, page_size, client):
+        yield obj['Key']
+
+
+def list_prefixes(bucket, prefix='', delimiter='/', client=None):
+    prefixes = []
+    for page in iter_pages(bucket, prefix, delimiter, client=client):
+        prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+    return prefixes
+
+
+def iter_objects_parallel(bucket, prefix='', delimiter='/', max_workers=8, max_pages=16, client=None):
+    """Fan out over the common prefixes below `prefix` and list them in parallel.
+
+    Pages are handed over through a bounded queue so at most `max_pages`
+    pages are held in memory. Order is not preserved across prefixes.
+    """
+    client = client or aws_clients.client('s3')
+
+    # objects directly under prefix, collect sub prefixes for fan out
+    prefixes = []
+    for page in iter_pages(bucket, prefix, delimiter, client=client):
+        yield from page.get('Contents', [])
+        prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+
+    def pages(sub_prefix):
+        for page in iter_pages(bucket, sub_prefix, client=client):
+            yield page.get('Contents', [])
+
+    yield from aws_parallel.iter_pages_parallel(pages, prefixes, max_workers, max_pages)
+
+
+def iter_dataframes(objects, chunk_size=10000):
+    import pandas as pd
+
+    chunk = []
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk)
+
+
+# --- DELETE ---
+
+# delete_objects takes up to 1000 keys per request, batches are sent while
+# the listing is still running
+
+
+def iter_versions(bucket, prefix='', page_size=1000, client=None):
+    client = client or aws_clients.client('s3')
+    paginator = client.get_paginator('list_object_versions')
+    pages = paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={'PageSize': page_size})
+    for page in pages:
+        for version in page.get('Versions', []) + page.get('DeleteMarkers', []):
+            yield {'Key': version['Key'], 'VersionId': version['VersionId']}
+
+
+def is_versioned(bucket, client=None):
+    client = client or aws_clients.client('s3')
+    status = client.get_bucket_versioning(Bucket=bucket).get('Status')
+    # suspended buckets can still hold old versions
+    return status in ('Enabled', 'Suspended')
+
+
+def _delete_batch(client, bucket, batch):
+    response = client.delete_objects(Bucket=bucket, Delete={'Objects': batch, 'Quiet': True})
+    return len(batch) - len(response.get('Errors', [])), response.get('Errors', [])
+
+
+def delete_objects(bucket, objects, batch_size=1000, max_workers=8, client=None):
+    """Delete keys (str) or {'Key', 'VersionId'} dicts in batched requests.
+
+    Returns {'deleted': count, 'errors': [{'Key', 'Code', 'Message', ...}]}.
+    """
+    client = client or aws_clients.client('s3')
+    batch_size = min(batch_size, 1000)
+    result = {'deleted': 0, 'errors': []}
+    objects = ({'Key': obj} if isinstance(obj, str) else obj for obj in objects)
+    # keep listing ahead of deletes but bound the batches in memory
+    for deleted, errors in aws_parallel.map_bounded(
+        lambda batch: _delete_batch(client, bucket, batch),
+        aws_parallel.chunks(objects, batch_size),
+        max_workers,
+    ):
+        result['deleted'] += deleted
+        result['errors'].extend(errors)
+    return result
+
+
+def empty_bucket(bucket, prefix='', versions=None, max_workers=8, client=None):
+    client = client or aws_clients.client('s3')
+    if versions is None:
+        versions = is_versioned(bucket, client)
+    if versions:
+        objects = iter_versions(bucket, prefix, client=client)
+    else:
+        objects = iter_keys(bucket, prefix, client=client)
+    return delete_objects(bucket, objects, max_workers=max_workers, client=client)
+
+
+# --- STREAMING TRANSFORM ---
+
+# read the body in chunks, transform each chunk and write it back through a
+# multipart upload so memory is bounded by part_size rather than object size
+
+MIN_PART_SIZE = 5 * MB
+
+
+def transform_object(
+    bucket,
+    key,
+    transform,
+    dest_bucket=None,
+    dest_key=None,
+    read_size=1 * MB,
+    part_size=8 * MB,
+    skip_unchanged=True,
+    client=None,
+):
+    """Stream s3://bucket/key through `transform` into s3://dest_bucket/dest_key.
+
+    `transform` is called with each chunk and returns the bytes to write. It
+    must not depend on chunk boundaries; a transform with a `flush()` method
+    gets a final call for any buffered tail. With `skip_unchanged` nothing is
+    written when no chunk changed, which also keeps an S3 triggered lambda
+    writing back to its own key from re-triggering itself.
+
+    Returns the number of bytes written, or None when the write was skipped.
+    """
+    client = client or aws_clients.client('s3')
+    dest_bucket = dest_bucket or bucket
+    dest_key = dest_key or key
+    part_size = max(part_size, MIN_PART_SIZE)
+
+    body = client.get_object(Bucket=bucket, Key=key)['Body']
+    # the multipart upload is only created once a full part is ready, output
+    # that fits in one part goes up with a single put_object
+    upload_id = None
+    parts = []
+    buffer = bytearray()
+    written = 0
+    changed = False
+
+    def send(data):
+        nonlocal upload_id
+        if upload_id is None:
+            upload_id = client.create_multipart_upload(Bucket=dest_bucket, Key=dest_key)['UploadId']
+        response = client.upload_part(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            PartNumber=len(parts) + 1,
+            Body=data,
+        )
+        parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+
+    try:
+        for chunk in body.iter_chunks(read_size):
+            out = transform(chunk)
+            changed = changed or out != chunk
+            buffer += out
+            while len(buffer) >= part_size:
+                send(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+                written += part_size
+        if hasattr(transform, 'flush'):
+            tail = transform.flush()
+            changed = changed or bool(tail)
+            buffer += tail
+
+        if skip_unchanged and not changed and (dest_bucket, dest_key) == (bucket, key):
+            if upload_id is not None:
+                client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+                upload_id = None
+            return None
+
+        if upload_id is None:
+            client.put_object(Bucket=dest_bucket, Key=dest_key, Body=bytes(buffer))
+            return len(buffer)
+
+        # the last part may be smaller than 5 MB
+        if buffer:
+            send(bytes(buffer))
+            written += len(buffer)
+        client.complete_multipart_upload(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts},
+        )
+    except Exception:
+        if upload_id is not None:
+            client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+        raise
+    finally:
+        body.close()
+
+    return written
+
+
+# --- RANGED DOWNLOAD ---
+
+# concurrent Range GETs written straight into a pre-sized mmap, each worker
+# reads its range into its own slice of the map
+
+
+def _read_into(body, view):
+    # read directly into the target slice when the raw stream supports it
+    raw = getattr(body, '_raw_stream', None)
+    readinto = getattr(raw, 'readinto', None)
+    pos = 0
+    if readinto is not None:
+        while pos < len(view):
+            n = readinto(view[pos:])
+            if not n:
+                break
+            pos += n
+    else:
+        for chunk in body.iter_chunks(MB):
+            view[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+    body.close()
+    if pos != len(view):
+        raise IOError(f'expected {len(view)} bytes, got {pos}')
+
+
+def _fetch_ranges(client, bucket, key, etag, view, part_size, max_workers):
+    def fetch(start):
+        end = min(start + part_size, len(view)) - 1
+        response = client.get_object(
+            Bucket=bucket, Key=key, Range=f'bytes={start}-{end}', IfMatch=etag,
+        )
+        _read_into(response['Body'], view[start:end + 1])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fetch, start) for start in range(0, len(view), part_size)]
+        for future in as_completed(futures):
+            future.result()
+
+
+def download_ranges(bucket, key, path, part_size=8 * MB, max_workers=8, client=None):
+    client = client or aws_clients.client('s3')
+    head = client.head_object(Bucket=bucket, Key=key)
+    size = head['ContentLength']
+    with open(path, 'wb+') as file:
+        file.truncate(size)
+        if not size:
+            return path
+        with mmap.mmap(file.fileno(), size) as mm:
+            view = memoryview(mm)
+            try:
+                _fetch_ranges(client, bucket, key, head['ETag'], view, part_size, max_workers)
+            finally:
+                view.release()
+            mm.flush()
+    return path
+
+
+def download_to_memory(bucket, key, part_size=8 * MB, max_workers=8, client=None):
+    """Ranged download into an anonymous mmap, returned as a memoryview.
+
+    The view keeps the map alive; call release() on it when done.
+    """
+    client = client or aws_clients.client('s3')
+    head = client.head_object(Bucket=bucket, Key=key)
+    size = head['ContentLength']
+    if not size:
+        return memoryview(b'')
+    view = memoryview(mmap.mmap(-1, size))
+    _fetch_ranges(client, bucket, key, head['ETag'], view, part_size, max_workers)
+    return view
+
+
+# --- IN-MEMORY PUT ---
+
+# upload bytes, buffers or a generator of chunks without a temp file, parts
+# are staged in reusable buffers from a pool instead of new allocations
+
+
+class BufferPool:
+    """Part buffers reused across uploads, allocated on first use.
+
+    At most `count` buffers are in use at once, acquire blocks beyond that,
+    which throttles the producer. reserve() raises the limit while an upload
+    runs so concurrent uploads on a shared pool never wait on each other's
+    buffers; up to `keep` idle buffers are kept for the next upload.
+    """
+    # needs at least two buffers per upload, put_bytes holds one back while filling the next
+
+    def __init__(self, size=8 * MB, count=4, keep=None):
+        self.size = size
+        self.count = count
+        self.keep = count if keep is None else keep
+        self.created = 0
+        self.free = []
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while not self.free and self.created - len(self.free) >= self.count:
+                self.cond.wait()
+            if self.free:
+                return self.free.pop()
+            self.created += 1
+        return bytearray(self.size)
+
+    def release(self, buffer):
+        with self.cond:
+            self.free.append(buffer)
+            self._trim()
+            self.cond.notify()
+
+    def reserve(self, count):
+        """Raise the limit by `count`, a negative count gives a reservation back."""
+        with self.cond:
+            self.count += count
+            self._trim()
+            self.cond.notify_all()
+
+    def _trim(self):
+        while self.free and self.created > max(self.count, self.keep):
+            self.free.pop()
+            self.created -= 1
+
+
+# one pool per part size, shared by every put_bytes call without its own
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(part_size, keep=4):
+    with _pools_lock:
+        if part_size not in _pools:
+            _pools[part_size] = BufferPool(part_size, count=0, keep=keep)
+        return _pools[part_size]
+
+
+class ViewReader(io.RawIOBase):
+    """Seekable file-like object over a memoryview, botocore reads it without a copy."""
+
+    def __init__(self, view):
+        self.view = memoryview(view).cast('B')
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self.view) - self.pos)
+        buffer[:n] = self.view[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = len(self.view) + offset
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def __len__(self):
+        return len(self.view)
+
+
+def _is_buffer(data):
+    try:
+        memoryview(data)
+    except TypeError:
+        return False
+    return True
+
+
+def _iter_parts(chunks, pool):
+    # copy incoming chunks into pooled buffers, yield (buffer, length) when full,
+    # a yielded buffer belongs to the caller, the one being filled goes back on close
+    buffer = pool.acquire()
+    pos = 0
+    try:
+        for chunk in chunks:
+            view = memoryview(chunk).cast('B')
+            while view:
+                n = min(len(view), pool.size - pos)
+                buffer[pos:pos + n] = view[:n]
+                pos += n
+                view = view[n:]
+                if pos == pool.size:
+                    full, buffer = buffer, None
+                    yield full, pos
+                    buffer = pool.acquire()
+                    pos = 0
+        full, buffer = buffer, None
+        yield full, pos
+    finally:
+        if buffer is not None:
+            pool.release(buffer)
+
+
+def put_bytes(bucket, key, data, part_size=8 * MB, max_workers=4, pool=None, client=None):
+    """Upload bytes, a buffer-protocol object or an iterable of chunks.
+
+    Small payloads go up in one put_object, larger ones as a multipart
+    upload with up to `max_workers` parts in flight. Never touches disk.
+    Iterables are copied into part buffers from `pool`, by default a pool
+    per part size shared by all calls. Returns the number of bytes uploaded.
+    """
+    client = client or aws_clients.client('s3')
+    part_size = max(part_size, MIN_PART_SIZE)
+
+    if _is_buffer(data):
+        view = memoryview(data).cast('B')
+        if len(view) <= part_size:
+            client.put_object(Bucket=bucket, Key=key, Body=ViewReader(view))
+            return len(view)
+        parts = ((view[i:i + part_size], None) for i in range(0, len(view), part_size))
+        return _upload_parts(client, bucket, key, parts, None, max_workers)
+
+    reserved = 0
+    if pool is None:
+        pool = shared_pool(part_size)
+        reserved = max_workers + 1
+        pool.reserve(reserved)
+    chunks = _iter_parts(data, pool)
+    parts = ((memoryview(buffer)[:n], buffer) for buffer, n in chunks)
+    try:
+        return _upload_parts(client, bucket, key, parts, pool, max_workers)
+    finally:
+        chunks.close()
+        pool.reserve(-reserved)
+
+
+def _upload_parts(client, bucket, key, parts, pool, max_workers):
+    # parts: iterable of (view, pooled buffer or None), buffers are released once sent
+
+    def release(buffer):
+        if buffer is not None:
+            pool.release(buffer)
+
+    # hold one part back so a stream that fits in a single part is a plain put
+    first_view, first_buffer = next(parts)
+    second = None
+    try:
+        second = next(parts, None)
+        if second is None:
+            client.put_object(Bucket=bucket, Key=key, Body=ViewReader(first_view))
+            return len(first_view)
+        upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+    except Exception:
+        if second is not None:
+            release(first_buffer)
+            release(second[1])
+        raise
+    finally:
+        if second is None:
+            release(first_buffer)
+    etags = {}
+    total = 0
+
+    def send(number, view, buffer):
+        try:
+            response = client.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id,
+                PartNumber=number, Body=ViewReader(view),
+            )
+            etags[number] = response['ETag']
+        finally:
+            release(buffer)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            all_parts = itertools.chain([(first_view, first_buffer), second], parts)
+            for number, (part, buffer) in enumerate(all_parts, start=1):
+                if not part and number > 1:
+                    # stream ended on a part boundary
+                    release(buffer)
+                    continue
+                total += len(part)
+                futures.append(executor.submit(send, number, part, buffer))
+            for future in as_completed(futures):
+                future.result()
+        client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': number, 'ETag': etags[number]} for number in sorted(etags)
+            ]},
+        )
+    except Exception:
+        client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    return total
@@ -0,0 +1,180 @@
+"""S3 object cache
+
+Disk backed read-through cache for objects that are read many times per run.
+Cached objects are revalidated with a conditional GET on the stored ETag, so
+an unchanged object costs one request and no body bytes. The index is
+written every `save_every` changes and on close().
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import aws_clients
+
+MB = 1024 ** 2
+
+
+def is_not_modified(error):
+    return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304 \
+        or error.response.get('Error', {}).get('Code') in ('304', 'NotModified')
+
+
+class ObjectCache:
+
+    def __init__(self, folder='.s3_cache', max_bytes=1024 * MB, save_every=100, client=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.save_every = save_every
+        self.client = client or aws_clients.client('s3')
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.changes = 0  # since the index was last saved
+        self.entries = OrderedDict()  # (bucket, key) -> {'etag', 'size', 'file'}, oldest first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+
+    # --- INDEX ---
+
+    @property
+    def index_path(self):
+        return os.path.join(self.folder, 'index.json')
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path) as file:
+            rows = json.load(file)
+        for bucket, key, entry in rows:
+            if os.path.exists(os.path.join(self.folder, entry['file'])):
+                self.entries[(bucket, key)] = entry
+                self.total_bytes += entry['size']
+
+    def save(self):
+        # written outside self.lock so reads and revalidations go on meanwhile
+        with self.save_lock:
+            with self.lock:
+                rows = [[bucket, key, entry] for (bucket, key), entry in self.entries.items()]
+                self.changes = 0
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump(rows, file)
+            os.replace(tmp_path, self.index_path)
+
+    def _changed(self):
+        # called with self.lock held, True when the index is due to be saved
+        self.changes += 1
+        return self.changes >= self.save_every
+
+    def close(self):
+        self.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # --- CACHE ---
+
+    def _file_name(self, bucket, key):
+        return hashlib.sha1(f'{bucket}/{key}'.encode()).hexdigest()
+
+    def _remove(self, entry):
+        self.total_bytes -= entry['size']
+        try:
+            os.remove(os.path.join(self.folder, entry['file']))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # least recently used first, always keep the newest entry
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self._remove(entry)
+
+    def _store(self, bucket, key, response):
+        file_name = self._file_name(bucket, key)
+        path = os.path.join(self.folder, file_name)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        size = 0
+        with open(tmp_path, 'wb') as file:
+            for chunk in response['Body'].iter_chunks(MB):
+                file.write(chunk)
+                size += len(chunk)
+        with self.lock:
+            os.replace(tmp_path, path)
+            old = self.entries.pop((bucket, key), None)
+            if old:
+                self.total_bytes -= old['size']
+            self.entries[(bucket, key)] = {'etag': response['ETag'], 'size': size, 'file': file_name}
+            self.total_bytes += size
+            self.bytes_downloaded += size
+            self.misses += 1
+            self._evict()
+            due = self._changed()
+        if due:
+            self.save()
+        return path
+
+    def get_path(self, bucket, key):
+        """Local path of an up to date copy of s3://bucket/key."""
+        from botocore.exceptions import ClientError
+
+        with self.lock:
+            entry = self.entries.get((bucket, key))
+        kwargs = {'Bucket': bucket, 'Key': key}
+        if entry:
+            kwargs['IfNoneMatch'] = entry['etag']
+        try:
+            response = self.client.get_object(**kwargs)
+        except ClientError as e:
+            if not (entry and is_not_modified(e)):
+                raise
+            with self.lock:
+                self.hits += 1
+                self.bytes_saved += entry['size']
+                if (bucket, key) in self.entries:
+                    self.entries.move_to_end((bucket, key))
+            return os.path.join(self.folder, entry['file'])
+        return self._store(bucket, key, response)
+
+    def get(self, bucket, key):
+        try:
+            with open(self.get_path(bucket, key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            # evicted between revalidation and read
+            self.invalidate(bucket, key)
+            with open(self.get_path(bucket, key), 'rb') as file:
+                return file.read()
+
+    def invalidate(self, bucket, key):
+        with self.lock:
+            entry = self.entries.pop((bucket, key), None)
+            due = False
+            if entry:
+                self._remove(entry)
+                due = self._changed()
+        if due:
+            self.save()
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'bytes_downloaded': self.bytes_downloaded,
+                'cached_objects': len(self.entries),
+                'cached_bytes': self.total_bytes,
+            }
@@ -0,0 +1,189 @@
+"""S3 key index
+
+Local SQLite index of the keys in a bucket (size, etag, last modified) so
+prefix, range and existence questions do not need a bucket listing. Build it
+once from a full listing, then keep it current from the S3 -> SQS event
+notifications set up in aws_sdk_s3_sqs.py. SQS hands each message to one
+consumer only, so the index does not read the queue itself: the handler of
+whatever consumes the events passes them to apply_records.
+
+    index = aws_s3_index.KeyIndex()
+
+    def handler(record):
+        index.apply_records([record])
+        process(record)
+"""
+
+import json
+import sqlite3
+import threading
+from urllib.parse import unquote_plus
+
+import aws_parallel
+import aws_s3
+import aws_sqs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER,
+    etag TEXT,
+    last_modified TEXT,
+    sequencer TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = '(bucket, key, size, etag, last_modified, sequencer, deleted)'
+
+# sorts after any key that starts with a given prefix
+PREFIX_END = '\U0010ffff'
+
+
+class KeyIndex:
+
+    def __init__(self, path='s3_index.db'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.touched = {}  # bucket -> keys changed by events while a build runs
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(objects)')]
+        if 'deleted' not in columns:
+            # index files from before removals were kept as tombstones
+            self.conn.execute('ALTER TABLE objects ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0')
+
+    def close(self):
+        self.conn.close()
+
+    # --- BUILD ---
+
+    def build(self, bucket, prefix='', batch_size=10000, client=None):
+        """Bring the rows under bucket/prefix in line with a full listing.
+
+        The listing is applied `batch_size` keys at a time, each batch in
+        its own transaction under the lock, so apply_records waits for one
+        batch at most. Keys that events change while the build runs keep
+        the row the event wrote. One build per bucket at a time.
+        """
+        with self.lock:
+            self.touched[bucket] = set()
+        count = 0
+        low, inclusive = prefix, True
+        try:
+            for objects in aws_parallel.chunks(aws_s3.iter_objects(bucket, prefix, client=client), batch_size):
+                rows = [
+                    (bucket, obj['Key'], obj['Size'], obj['ETag'].strip('"'), obj['LastModified'].isoformat(), None, 0)
+                    for obj in objects
+                ]
+                # listings come in key order, so the batch covers the keys up to its last one
+                with self.lock, self.conn:
+                    self._replace_range(bucket, low, inclusive, rows[-1][1], rows)
+                low, inclusive = rows[-1][1], False
+                count += len(rows)
+            with self.lock, self.conn:
+                self._replace_range(bucket, low, inclusive, prefix + PREFIX_END, [])
+        finally:
+            with self.lock:
+                del self.touched[bucket]
+        return count
+
+    def _replace_range(self, bucket, low, inclusive, high, rows):
+        touched = self.touched[bucket]
+        rows = [row for row in rows if row[1] not in touched]
+        listed = {row[1] for row in rows}
+        stale = [
+            (bucket, key) for key, in self.conn.execute(
+                f'SELECT key FROM objects WHERE bucket = ? AND key {">=" if inclusive else ">"} ? AND key <= ?',
+                (bucket, low, high),
+            )
+            if key not in listed and key not in touched
+        ]
+        self.conn.executemany('DELETE FROM objects WHERE bucket = ? AND key = ?', stale)
+        self.conn.executemany(f'INSERT OR REPLACE INTO objects {COLUMNS} VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    # --- EVENTS ---
+
+    def _apply_record(self, record):
+        if 's3' not in record:
+            return False
+        bucket = record['s3']['bucket']['name']
+        obj = record['s3']['object']
+        key = unquote_plus(obj['key'])
+        sequencer = aws_sqs.sequencer_key(obj.get('sequencer'))
+
+        # drop events older than what is already indexed for this key
+        row = self.conn.execute(
+            'SELECT sequencer FROM objects WHERE bucket = ? AND key = ?', (bucket, key)
+        ).fetchone()
+        if row and row[0] and row[0] >= sequencer:
+            return False
+
+        if record['eventName'].startswith('ObjectCreated'):
+            row = (bucket, key, obj.get('size'), obj.get('eTag'), record.get('eventTime'), sequencer, 0)
+        elif record['eventName'].startswith('ObjectRemoved'):
+            # a tombstone keeps the sequencer, so a late older create is still dropped
+            row = (bucket, key, None, None, record.get('eventTime'), sequencer, 1)
+        else:
+            return False
+        self.conn.execute(f'INSERT OR REPLACE INTO objects {COLUMNS} VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+        if bucket in self.touched:
+            self.touched[bucket].add(key)
+        return True
+
+    def apply_records(self, records):
+        """Apply S3 event records, returns how many changed the index."""
+        with self.lock, self.conn:
+            return sum(self._apply_record(record) for record in records)
+
+    def apply_message(self, body):
+        body_dict = json.loads(body) if isinstance(body, str) else body
+        return self.apply_records(body_dict.get('Records', []))
+
+    # --- QUERY ---
+
+    def _query(self, sql, params):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def exists(self, bucket, key):
+        return bool(self._query(
+            'SELECT 1 FROM objects WHERE bucket = ? AND key = ? AND NOT deleted', (bucket, key),
+        ))
+
+    def get(self, bucket, key):
+        rows = self._query(
+            'SELECT key, size, etag, last_modified FROM objects WHERE bucket = ? AND key = ? AND NOT deleted',
+            (bucket, key),
+        )
+        if rows:
+            return dict(zip(('Key', 'Size', 'ETag', 'LastModified'), rows[0]))
+        return None
+
+    def iter_range(self, bucket, start, end, page_size=1000):
+        """Yield index rows with start <= key < end in key order."""
+        while True:
+            rows = self._query(
+                'SELECT key, size, etag, last_modified FROM objects '
+                'WHERE bucket = ? AND key >= ? AND key < ? AND NOT deleted ORDER BY key LIMIT ?',
+                (bucket, start, end, page_size),
+            )
+            for row in rows:
+                yield dict(zip(('Key', 'Size', 'ETag', 'LastModified'), row))
+            if len(rows) < page_size:
+                return
+            # continue strictly after the last key
+            start = rows[-1][0] + '\x00'
+
+    def iter_prefix(self, bucket, prefix, page_size=1000):
+        return self.iter_range(bucket, prefix, prefix + PREFIX_END, page_size)
+
+    def count(self, bucket, prefix=''):
+        return self._query(
+            'SELECT COUNT(*) FROM objects WHERE bucket = ? AND key >= ? AND key < ? AND NOT deleted',
+            (bucket, prefix, prefix + PREFIX_END),
+        )[0][0]
@@ -5,47 +5,24 @@ import json
 import os
 from pprint import pprint
 
-import boto3
 from botocore.exceptions import ClientError
 import pandas as pd
 
+import aws_clients
+import aws_dynamo
+import aws_dynamo_codec
+
 # settings
 table_name = 'my_table'
 
-dy_client = boto3.client('dynamodb')
-dy_res = boto3.resource('dynamodb')
+dy_client = aws_clients.client('dynamodb')
+dy_res = aws_clients.resource('dynamodb')
 
 # list tables 
 dy_client.list_tables()
 
 # create table
-table = dy_res.create_table(
-    TableName = table_name,
-    KeySchema=[
-        {
-            'AttributeName': 'key',
-            'KeyType': 'HASH'  # Partition key
-        },
-        {
-            'AttributeName': 'text',
-            'KeyType': 'RANGE'  # Sort key
-        }
-    ],
-    AttributeDefinitions=[
-        {
-            'AttributeName': 'key',
-            'AttributeType': 'N'
-        },
-        {
-            'AttributeName': 'text',
-            'AttributeType': 'S'
-        },
-    ],
-    ProvisionedThroughput={
-        'ReadCapacityUnits': 10,
-        'WriteCapacityUnits': 10
-    }
-)
+table = aws_dynamo.create_table(table_name, read_capacity=10, write_capacity=10)
 
 # add item
 item = {
@@ -59,6 +36,24 @@ item = {
 table = dy_res.Table(table_name)
 table.put_item(Item=item)
 
+# same item through the low level client, skipping the resource layer's type conversion
+dy_client.put_item(TableName=table_name, Item=aws_dynamo_codec.encode_item(item))
+response = dy_client.get_item(TableName=table_name, Key=aws_dynamo_codec.encode_item({'key': 0, 'text': 'zero'}))
+print(aws_dynamo_codec.decode_item(response['Item']))
+
+# add many items, 25 per request
+items = ({'key': i, 'text': str(i), 'stuff': {'message': 'hello'}} for i in range(1000))
+result = aws_dynamo.batch_write(table_name, puts=items, max_workers=4)
+print(result['written'], result['items_per_sec'], len(result['unprocessed']), len(result['failed']))
+
+# meter consumed capacity and pace requests under the provisioned 10 RCU / 10 WCU
+metered = aws_dynamo.MeteredClient(read_capacity=10, write_capacity=10)
+items = ({'key': i, 'text': str(i), 'stuff': {'message': 'hello'}} for i in range(1000, 1100))
+aws_dynamo.batch_write(table_name, puts=items, client=metered)
+for item in aws_dynamo.query(table_name, 0, client=metered):
+    print(item)
+print(metered.stats())
+
 # read item
 table = dy_res.Table(table_name)
 try:
@@ -68,6 +63,45 @@ except ClientError as e:
 else:
     print(response['Item'])
 
+# read hot items through an in-memory cache, writes through it invalidate
+cached = aws_dynamo.CachedTable(table_name, max_items=10000, ttl_seconds=60)
+for _ in range(10):
+    cached.get_item(0, 'zero')
+cached.update_item(
+    0, 'zero',
+    UpdateExpression="set stuff.message=:r",
+    ExpressionAttributeValues={':r': 'hello cache'},
+)
+print(cached.get_item(0, 'zero'))
+print(cached.stats())
+
+# read many items, 100 keys per request, only the fields needed
+keys = ((i, str(i)) for i in range(1000))
+for item in aws_dynamo.batch_get(table_name, keys, projection=['key', 'stuff']):
+    print(item)
+
+# query one partition, streaming the range key matches page by page
+for item in aws_dynamo.query(table_name, 0, aws_dynamo.begins_with('ze'), page_size=100):
+    print(item)
+for item in aws_dynamo.query(table_name, 0, aws_dynamo.between('a', 'm'), projection=['text', 'stuff']):
+    print(item)
+
+# spread hot keys over several partition keys, reads gather all shards
+# (a separate table, sharded tables store every key in the physical layout)
+aws_dynamo.create_table('my_sharded_table').wait_until_exists()
+sharded = aws_dynamo.ShardedTable('my_sharded_table', shards={0: 10, 1: 10})
+sharded.batch_write(puts=({'key': i % 3, 'text': str(i), 'stuff': {'message': 'hello'}} for i in range(1000)))
+print(sharded.get_item(0, '3'))
+for item in sharded.query(0, aws_dynamo.begins_with('9')):
+    print(item)
+
+# scan the whole table in parallel segments, in bounded dataframe chunks
+for items_df in aws_dynamo.iter_scan_dataframes(table_name, chunk_size=10000, total_segments=8):
+    print(items_df.shape)
+
+# export the table to parquet, one process per segment
+aws_dynamo.scan_to_parquet(table_name, 'my_table_export', total_segments=8)
+
 # update item
 table = dy_res.Table(table_name)
 response = table.update_item(
@@ -118,4 +152,5 @@ else:
 #     return response
 
 # delete table
-dy_client.delete_table(TableName=table_name)
\ No newline at end of file
+dy_client.delete_table(TableName=table_name)
+dy_client.delete_table(TableName='my_sharded_table')
\ No newline at end of file
@@ -5,16 +5,16 @@ Spin up a ec2 instance and host a webserver. This is the simplified version
 of running the same in an vpc.
 """
 
-import boto3
 import pandas as pd
 
+import aws_clients
 import aws_security_group
 import aws_iam
 
 pd.options.display.max_colwidth = 200
 
-ec2_client = boto3.client('ec2')
-ec2_res = boto3.resource('ec2')
+ec2_client = aws_clients.client('ec2')
+ec2_res = aws_clients.resource('ec2')
 
 # --- SETTINGS ---
 
@@ -30,7 +30,7 @@ instance_profile = aws_iam.get_instance_profile()
 
 # --- SSM --
 
-ssm_client = boto3.client('ssm')
+ssm_client = aws_clients.client('ssm')
 
 ami_params = ssm_client.get_parameters_by_path(Path='/aws/service/ami-amazon-linux-latest')
 ami_df = pd.DataFrame(ami_params['Parameters'])
@@ -1,15 +1,18 @@
 
 import json
 
-import boto3
 import pandas as pd
 
+import aws_clients
+import aws_s3
+import aws_s3_cache
+
 # --- S3 ---
 
 # https://boto3.amazonaws.com/v1/documentation/api/latest/guide/s3-examples.html
 
-s3_client = boto3.client('s3')
-s3_res = boto3.resource('s3')
+s3_client = aws_clients.client('s3')
+s3_res = aws_clients.resource('s3')
 
 # list buckets
 buckets = s3_client.list_buckets()
@@ -21,20 +24,43 @@ bucket_name = 'sample-bucket-afasfsagad'
 s3_client.create_bucket(Bucket=bucket_name)
 
 # add a file
+aws_s3.put_bytes(bucket_name, 'sample', b'hello world')
+
+# add a file from a generator of chunks, no temp file
+aws_s3.put_bytes(bucket_name, 'sample_lines', (f'line {i}\n'.encode() for i in range(1000)))
+
+# upload an existing local file
 with open('sample.txt', 'w') as file:
     file.writelines(['hello world'])
 s3_client.upload_file('sample.txt', bucket_name, 'sample')
 
-# list files
-objects = s3_client.list_objects(Bucket=bucket_name)
-objects_df = pd.DataFrame(objects['Contents'])
-objects_df
+# add many files in parallel, multipart
+engine = aws_s3.TransferEngine(part_size=8 * aws_s3.MB, max_concurrency=10, max_workers=8)
+outcomes = engine.upload_files([('sample.txt', bucket_name, f'sample_{i}') for i in range(10)])
+failed = [(item, result) for item, result in outcomes if isinstance(result, Exception)]
+print(failed)
+engine.stats.summary()
+
+# list files, paginated so it does not stop at 1000 keys
+for objects_df in aws_s3.iter_dataframes(aws_s3.iter_objects(bucket_name), chunk_size=10000):
+    print(objects_df)
+
+# list files, one prefix per worker
+for obj in aws_s3.iter_objects_parallel(bucket_name, delimiter='/', max_workers=8):
+    print(obj['Key'])
 
 # read file
 obj = s3_res.Object(bucket_name, 'sample')
 text = obj.get()['Body'].read()
 print(text)
 
+# read file through the local cache, repeated reads only revalidate the etag
+cache = aws_s3_cache.ObjectCache('.s3_cache', max_bytes=1024 * aws_s3.MB)
+text = cache.get(bucket_name, 'sample')
+text = cache.get(bucket_name, 'sample')
+cache.stats()
+cache.close()
+
 # alter
 text = text.upper()
 print(text)
@@ -43,12 +69,33 @@ print(text)
 obj = s3_res.Object(bucket_name, 'sample')
 obj.put(Body=text)
 
+# alter and put, streamed so large objects do not have to fit in memory
+aws_s3.transform_object(bucket_name, 'sample_0', bytes.upper)
+
 # download a file
 s3_client.download_file(bucket_name, 'sample', 'sample.txt')
 
+# download many files in parallel
+engine.reset_stats()
+engine.download_files([(bucket_name, f'sample_{i}', f'sample_{i}.txt') for i in range(10)])
+engine.stats.summary()
+engine.close()
+
+# download a large file with concurrent range requests into a mmap
+aws_s3.download_ranges(bucket_name, 'sample', 'sample.txt', part_size=8 * aws_s3.MB)
+
+# or keep it in memory
+view = aws_s3.download_to_memory(bucket_name, 'sample')
+print(bytes(view[:100]))
+view.release()
+
 # delete a file
 s3_client.delete_object(Bucket=bucket_name, Key='sample')
 
+# delete many files, 1000 keys per request
+result = aws_s3.delete_objects(bucket_name, aws_s3.iter_keys(bucket_name, prefix='sample_'))
+print(result['deleted'], result['errors'])
+
 # add a bucket policy
 # http://awspolicygen.s3.amazonaws.com/policygen.html
 
@@ -93,7 +140,7 @@ noread_policy = json.dumps(noread_policy)
 s3_client.put_bucket_policy(Bucket=bucket_name, Policy=noread_policy)
 
 # delete bucket
-sts_client = boto3.client('sts')
+sts_client = aws_clients.client('sts')
 account = sts_client.get_caller_identity()['Arn']
 s3_client.delete_bucket(Bucket=bucket_name, ExpectedBucketOwner=account)
 # this failed, manually deleted from console
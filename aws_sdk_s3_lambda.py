@@ -3,12 +3,15 @@
 Goal: Create a s3 file upload triggered lambda
 """
 
+import io
 import json
 import zipfile
 
-import boto3
 import pandas as pd
 
+import aws_clients
+import aws_s3
+
 # --- SETTINGS 
 
 lambda_name = 'textToUpperTwo'
@@ -27,8 +30,8 @@ bucket_name_lambda = 'lambda-function-bucket-ghagkdl'
 
 # https://boto3.amazonaws.com/v1/documentation/api/latest/guide/s3-examples.html
 
-s3_client = boto3.client('s3')
-s3_res = boto3.resource('s3')
+s3_client = aws_clients.client('s3')
+s3_res = aws_clients.resource('s3')
 
 # list buckets
 buckets = s3_client.list_buckets()
@@ -41,7 +44,7 @@ s3_client.create_bucket(Bucket=bucket_name_lambda)
 
 # --- IAM ---
 
-iam_client = boto3.client('iam')
+iam_client = aws_clients.client('iam')
 
 # define policy
 policy_document = json.dumps({
@@ -73,6 +76,12 @@ policy_document = json.dumps({
             "Effect": "Allow",
             "Action": "s3:*Object*",
             "Resource": [f"arn:aws:s3:::{bucket_name}/*"]
+        },
+        {
+            "Sid": "AbortFailedUploads",
+            "Effect": "Allow",
+            "Action": "s3:AbortMultipartUpload",
+            "Resource": [f"arn:aws:s3:::{bucket_name}/*"]
         }
     ]
 })
@@ -129,7 +138,7 @@ iam_client.attach_role_policy(
 
 # --- LOG GROUPS ---
 
-logs_client = boto3.client('logs')
+logs_client = aws_clients.client('logs')
 
 response_lg = logs_client.create_log_group(
     logGroupName=f'/aws/lambda/{lambda_name}',
@@ -140,7 +149,7 @@ response_lg
 
 # --- LAMBDA --- 
 
-ld_client = boto3.client('lambda')
+ld_client = aws_clients.client('lambda')
 
 # list functions
 functions_df = pd.DataFrame(ld_client.list_functions()['Functions'])
@@ -161,11 +170,46 @@ functions_df
 
 code_content = """
 import json
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+
+# shipped in function.zip next to this file
+import aws_clients
+import aws_s3
+
+MB = 1024 ** 2
+PART_SIZE = 8 * MB
+MAX_WORKERS = 64
+
+# boto3 S3 initialization, one connection per worker
+s3_client = aws_clients.client('s3', max_pool_connections=MAX_WORKERS)
+
+
+def worker_count(context, records):
+    # each worker buffers up to a part plus a chunk, use half the memory for that
+    memory_mb = int(getattr(context, 'memory_limit_in_mb', 128))
+    per_worker_mb = PART_SIZE // MB + 1
+    return max(1, min(MAX_WORKERS, len(records), memory_mb // 2 // per_worker_mb))
+
+
+def s3_records(record):
+    # direct S3 notifications carry the S3 record, SQS messages wrap them in the body
+    if 'body' in record:
+        return json.loads(record['body']).get('Records', [])
+    return [record]
+
+
+def process_record(record):
+    results = []
+    for s3_record in s3_records(record):
+        bucket = s3_record['s3']['bucket']['name']
+        key = unquote_plus(s3_record['s3']['object']['key'])
+        # streamed through a multipart upload, skipped when nothing changed so
+        # the put does not trigger this lambda again
+        written = aws_s3.transform_object(bucket, key, bytes.upper, part_size=PART_SIZE, client=s3_client)
+        results.append((key, written))
+    return results
 
-# boto3 S3 initialization
-s3_client = boto3.client("s3")
-s3_res = boto3.resource('s3')
 
 def lambda_handler(event, context):
 
@@ -175,38 +219,38 @@ def lambda_handler(event, context):
     # log context
     print(context)
 
-    # get object details
-    source_bucket_name = event['Records'][0]['s3']['bucket']['name']
-    file_key_name = event['Records'][0]['s3']['object']['key']
-    print(source_bucket_name, file_key_name)
-
-    # load object
-    obj = s3_res.Object(source_bucket_name, file_key_name)
-    text = obj.get()['Body'].read()
-
-    if text.upper() != text:
-
-        # alter
-        text = text.upper()
-        print(text)
-
-        # put
-        obj = s3_res.Object(source_bucket_name, file_key_name)
-        obj.put(Body=text)
+    # alter and put every record of the batch concurrently
+    records = event.get('Records', [])
+    failures = []
+    with ThreadPoolExecutor(max_workers=worker_count(context, records)) as pool:
+        futures = [pool.submit(process_record, record) for record in records]
+        for record, future in zip(records, futures):
+            try:
+                print(future.result())
+            except Exception as e:
+                print('failed', record, repr(e))
+                failures.append(record)
+
+    # SQS batches retry only the failed messages, direct S3 events are
+    # retried whole, already uppercased objects are skipped on the retry
+    if failures and not all('messageId' in record for record in failures):
+        raise RuntimeError(f'{len(failures)} of {len(records)} records failed')
 
     return {
         'statusCode': 200,
-        'body': json.dumps('Hello from Lambda!')
+        'body': json.dumps(f'processed {len(records) - len(failures)} of {len(records)} records'),
+        'batchItemFailures': [{'itemIdentifier': record['messageId']} for record in failures],
     }
 
 """
 
-# zip and upload to s3 for use in lambda
-open('code.py', 'w').writelines(code_content)
-archive = zipfile.ZipFile('function.zip', 'w')
-archive.write('code.py', './code.py')
-archive.close()
-s3_client.upload_file('function.zip', Bucket=bucket_name_lambda, Key='function.zip')
+# zip in memory with the helper modules the handler uses, upload to s3 for use in lambda
+zip_buffer = io.BytesIO()
+with zipfile.ZipFile(zip_buffer, 'w') as archive:
+    archive.writestr('code.py', code_content)
+    for module in ('aws_clients.py', 'aws_parallel.py', 'aws_s3.py'):
+        archive.write(module)
+aws_s3.put_bytes(bucket_name_lambda, 'function.zip', zip_buffer.getbuffer())
 
 # https://docs.aws.amazon.com/lambda/latest/dg/python-handler.html
 
@@ -265,8 +309,7 @@ response_trigger
 
 for i in range(10):
     file_name = f'test_40{i}.txt'
-    open(file_name, 'w').writelines(['hello'])
-    s3_client.upload_file(file_name, Bucket=bucket_name, Key=file_name)
+    aws_s3.put_bytes(bucket_name, file_name, b'hello')
 
 # check result
 obj = s3_res.Object(bucket_name, file_name)
@@ -289,11 +332,9 @@ iam_client.delete_policy(PolicyArn=policy_arn)
 logs_client.delete_log_group(logGroupName=f'/aws/lambda/{lambda_name}')
 
 # empty and delete buckets
-bucket = s3_res.Bucket(bucket_name)
-bucket.objects.all().delete()
+aws_s3.empty_bucket(bucket_name)
 s3_client.delete_bucket(Bucket=bucket_name)
 
 # empty and delete lambda bucket
-bucket = s3_res.Bucket(bucket_name_lambda)
-bucket.objects.all().delete()
+aws_s3.empty_bucket(bucket_name_lambda)
 s3_client.delete_bucket(Bucket=bucket_name_lambda)
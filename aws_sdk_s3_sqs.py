@@ -2,9 +2,13 @@
 
 import json
 
-import boto3
 import pandas as pd
 
+import aws_clients
+import aws_s3
+import aws_s3_index
+import aws_sqs
+
 # --- SETTINGS ---
 
 tags = [
@@ -19,8 +23,8 @@ queue_name = "upload_queue"
 
 # https://boto3.amazonaws.com/v1/documentation/api/latest/guide/s3-examples.html
 
-s3_client = boto3.client('s3')
-s3_res = boto3.resource('s3')
+s3_client = aws_clients.client('s3')
+s3_res = aws_clients.resource('s3')
 
 # List buckets
 buckets = s3_client.list_buckets()
@@ -37,8 +41,8 @@ s3_client.create_bucket(Bucket=bucket_name)
 
 # --- SQS ---
 
-sqs_client = boto3.client("sqs")
-sqs_res = boto3.resource("sqs")
+sqs_client = aws_clients.client("sqs")
+sqs_res = aws_clients.resource("sqs")
 
 # List queue
 queues = sqs_client.list_queues()
@@ -46,85 +50,78 @@ queue_df = pd.DataFrame(queues.get("QueueUrls", []))
 queue_df
 
 # Create a queue
-queue_resp = sqs_client.create_queue(QueueName=queue_name, tags=tags[0])
-queue_url = queue_resp["QueueUrl"]
-queue_attributes = sqs_client.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["All"])
-queue_arn = queue_attributes["Attributes"]["QueueArn"]
+queue_url, queue_arn = aws_sqs.create_queue(queue_name, tags=tags[0])
 print(queue_arn)
 
 # # Delete a queue
-# sqs_client.delete_queue(QueueUrl=queue_url)
+# aws_sqs.delete_queue(queue_url)
 
 # --- IAM ---
 
-# iam_client = boto3.client('iam')
-
-# Define policy
-policy_document = json.dumps({
-    "Version": "2012-10-17",
-    "Statement": [
-        {
-            "Effect": "Allow",
-            "Action": "SQS:SendMessage",
-            "Resource": queue_arn,
-            "Condition": {"ArnLike": { "aws:SourceArn": f"arn:aws:s3:*:*:{bucket_name}"}},
-            "Principal": {"AWS": "*"},
-
-        }
-    ]
-})
-
-# Set policy
-sqs_client.set_queue_attributes(
-    QueueUrl=queue_url,
-    Attributes={'Policy': policy_document
-    }
-)
+# Allow the bucket to send to the queue
+aws_sqs.allow_bucket(queue_url, queue_arn, bucket_name)
 
 # --- EVENT ---
 
-bucket_notifications_configuration = {
-    'QueueConfigurations': [{
-        'Events': ['s3:ObjectCreated:*'],
-        'QueueArn': queue_arn
-    }]
-}
-
-resp = s3_client.put_bucket_notification_configuration(
-    Bucket=bucket_name,
-    NotificationConfiguration=bucket_notifications_configuration
-)
+resp = aws_sqs.notify_queue(bucket_name, queue_arn, events=['s3:ObjectCreated:*', 's3:ObjectRemoved:*'])
 resp
 
 # --- UPLOAD FILE ---
 
 for i in range(10):
     file_name = f'test_40{i}.txt'
-    open(file_name, 'w').writelines(['hello'])
-    s3_client.upload_file(file_name, Bucket=bucket_name, Key=file_name)
+    aws_s3.put_bytes(bucket_name, file_name, b'hello')
 
 # check result
 obj = s3_res.Object(bucket_name, file_name)
 text = obj.get()['Body'].read()
 print(text)
 
+# --- SEND MESSAGES ---
+
+# own messages, sent 10 per request
+with aws_sqs.QueueProducer(queue_url, linger_seconds=0.05) as producer:
+    for i in range(100):
+        producer.send(json.dumps({'message': i}))
+producer.stats()
+
 # --- GET MESSAGES ---
 
-def get_key():
-    message = sqs_client.receive_message(QueueUrl=queue_url)
-    body = message["Messages"][0]["Body"]
-    body_dict = json.loads(body)
-    return body_dict["Records"][0]["s3"]["object"]["key"]
+print(aws_sqs.get_keys(queue_url))
+
+# drain the queue, up to 10 messages per long poll
+consumer = aws_sqs.QueueConsumer(queue_url, wait_seconds=20)
+consumer.drain(lambda record: print(aws_sqs.record_key(record)))
+consumer.stats()
+
+# build a local key index once, the worker pool below keeps it current
+index = aws_s3_index.KeyIndex('s3_index.db')
+index.build(bucket_name)
+
+# process events in parallel, in-flight messages get their visibility extended
+def upper_object(record):
+    # each message goes to one consumer only, so the index is fed from here
+    index.apply_records([record])
+    if not record['eventName'].startswith('ObjectCreated'):
+        return
+    bucket = record['s3']['bucket']['name']
+    aws_s3.transform_object(bucket, aws_sqs.record_key(record), bytes.upper)
+
+dedup = aws_sqs.EventDeduplicator(max_size=100000, ttl_seconds=3600)
+pool = aws_sqs.QueueWorkerPool(
+    queue_url, upper_object, concurrency=8, prefetch=10, visibility_timeout=60, dedup=dedup,
+)
+pool.run(max_empty_receives=2)
+dedup.stats()
 
-for i in range(5):
-    print(get_key())
+print(index.exists(bucket_name, 'test_400.txt'))
+print(list(index.iter_prefix(bucket_name, 'test_40')))
 
 # --- CLEAN UP ---
 
 # Empty and delete buckets
-bucket = s3_res.Bucket(bucket_name)
-bucket.objects.all().delete()
+aws_s3.empty_bucket(bucket_name)
 s3_client.delete_bucket(Bucket=bucket_name)
 
 # Delete queue
-sqs_client.delete_queue(QueueUrl=queue_url)
+aws_sqs.delete_queue(queue_url)
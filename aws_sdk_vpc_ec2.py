@@ -6,11 +6,12 @@ Document to process to set up a VPC, EC2 based webserver.
 
 # Reference material: https://gist.github.com/nguyendv/8cfd92fc8ed32ebb78e366f44c2daea6
 
-import boto3
 import pandas as pd
 
-ec2_client = boto3.client('ec2')
-ec2_res = boto3.resource('ec2')
+import aws_clients
+
+ec2_client = aws_clients.client('ec2')
+ec2_res = aws_clients.resource('ec2')
 
 # --- SETTINGS ---
 
@@ -108,7 +109,7 @@ sg.authorize_ingress(IpPermissions=HTTP_PERMISSIONS)
 
 # --- SSM --
 
-ssm_client = boto3.client('ssm')
+ssm_client = aws_clients.client('ssm')
 
 ami_params = ssm_client.get_parameters_by_path(Path='/aws/service/ami-amazon-linux-latest')
 ami_df = pd.DataFrame(ami_params['Parameters'])
@@ -10,11 +10,12 @@ Document to process to set up a VPC, EC2 based webserver with auto scaling
 
 import time
 
-import boto3
 import pandas as pd
 
-ec2_client = boto3.client('ec2')
-ec2_res = boto3.resource('ec2')
+import aws_clients
+
+ec2_client = aws_clients.client('ec2')
+ec2_res = aws_clients.resource('ec2')
 
 # --- SETTINGS ---
 
@@ -126,7 +127,7 @@ time.sleep(1.0)
 
 # --- SSM --
 
-ssm_client = boto3.client('ssm')
+ssm_client = aws_clients.client('ssm')
 
 ami_params = ssm_client.get_parameters_by_path(Path='/aws/service/ami-amazon-linux-latest')
 ami_df = pd.DataFrame(ami_params['Parameters'])
@@ -184,7 +185,7 @@ user_data = '\n'.join(open('user_data.sh').readlines())
 
 # --- AUTO SCALER ---
 
-as_client = boto3.client('autoscaling')
+as_client = aws_clients.client('autoscaling')
 
 # autoscaler launch configuration
 as_launch_config = as_client.create_launch_configuration(
@@ -234,7 +235,7 @@ time.sleep(60.0)
 
 # --- LOAD BALANCER ---
 
-elb_client = boto3.client(service_name="elbv2")
+elb_client = aws_clients.client("elbv2")
 
 # create a load balancer
 lb_response = elb_client.create_load_balancer(
@@ -1,9 +1,5 @@
 
-import boto3
-import pandas as pd
-
-ec2_client = boto3.client('ec2')
-ec2_res = boto3.resource('ec2')
+import aws_clients
 
 # permissions
 HTTP_PERMISSIONS = [
@@ -25,12 +21,16 @@ HTTP_PERMISSIONS = [
 
 
 def get_security_group_df():
+    import pandas as pd
+
+    ec2_client = aws_clients.client('ec2')
     sgs = ec2_client.describe_security_groups()
     return pd.DataFrame(sgs['SecurityGroups'])
 
 
 def get_http_security_group(name='http', desc='http'):
     # TODO: update to handle vpc
+    ec2_client = aws_clients.client('ec2')
 
     # check if exists
     sg_df = get_security_group_df()
@@ -54,4 +54,5 @@ def get_http_security_group(name='http', desc='http'):
 
 
 def delete_security_group(name):
+    ec2_client = aws_clients.client('ec2')
     ec2_client.delete_security_group(GroupName=name)
@@ -0,0 +1,556 @@
+"""SQS helpers
+
+Reusable SQS functions for the S3 -> SQS pipeline in aws_sdk_s3_sqs.py.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from urllib.parse import unquote_plus
+
+import aws_clients
+
+
+def create_queue(name, tags=None):
+    sqs_client = aws_clients.client('sqs')
+    queue_url = sqs_client.create_queue(QueueName=name, tags=tags or {})['QueueUrl']
+    return queue_url, get_queue_arn(queue_url)
+
+
+def get_queue_arn(queue_url):
+    sqs_client = aws_clients.client('sqs')
+    attributes = sqs_client.get_queue_attributes(QueueUrl=queue_url, AttributeNames=['QueueArn'])
+    return attributes['Attributes']['QueueArn']
+
+
+def allow_bucket(queue_url, queue_arn, bucket_name):
+    # let s3 events from the bucket send to the queue
+    sqs_client = aws_clients.client('sqs')
+    policy_document = json.dumps({
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Action": "SQS:SendMessage",
+                "Resource": queue_arn,
+                "Condition": {"ArnLike": {"aws:SourceArn": f"arn:aws:s3:*:*:{bucket_name}"}},
+                "Principal": {"AWS": "*"},
+            }
+        ]
+    })
+    sqs_client.set_queue_attributes(QueueUrl=queue_url, Attributes={'Policy': policy_document})
+
+
+def notify_queue(bucket_name, queue_arn, events=('s3:ObjectCreated:*',)):
+    s3_client = aws_clients.client('s3')
+    return s3_client.put_bucket_notification_configuration(
+        Bucket=bucket_name,
+        NotificationConfiguration={
+            'QueueConfigurations': [{'Events': list(events), 'QueueArn': queue_arn}]
+        },
+    )
+
+
+def delete_queue(queue_url):
+    aws_clients.client('sqs').delete_queue(QueueUrl=queue_url)
+
+
+# --- CONSUMER ---
+
+# long poll for up to 10 messages per receive, expand every record of every
+# message and acknowledge the batch with a single delete_message_batch
+
+
+def iter_records(body):
+    body_dict = json.loads(body) if isinstance(body, str) else body
+    # s3 sends an s3:TestEvent without records when notifications are set up
+    yield from body_dict.get('Records', [])
+
+
+def record_key(record):
+    return unquote_plus(record['s3']['object']['key'])
+
+
+def sequencer_key(sequencer):
+    # sequencers of the same key compare as hex once right padded to equal length
+    return (sequencer or '').upper().ljust(32, '0')
+
+
+# --- DEDUP ---
+
+# s3 notifications are delivered at least once, drop repeated and stale
+# events for a key before the object is fetched
+
+
+class EventDeduplicator:
+    """Bounded, TTL evicting memory of the latest sequencer seen per (bucket, key).
+
+    check() returns False for an event whose sequencer is not newer than the
+    one already seen, and otherwise records it. Call forget() when handling
+    an accepted event fails so its redelivery is not dropped.
+    """
+
+    def __init__(self, max_size=100000, ttl_seconds=3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.seen = OrderedDict()  # (bucket, key) -> (sequencer, expires), oldest first
+        self.checked = 0
+        self.repeated = 0
+        self.stale = 0
+
+    def _evict(self, now):
+        while self.seen:
+            _, (_, expires) = next(iter(self.seen.items()))
+            if expires > now and len(self.seen) <= self.max_size:
+                return
+            self.seen.popitem(last=False)
+
+    def check(self, record):
+        obj = record['s3']['object']
+        if not obj.get('sequencer'):
+            return True
+        key = (record['s3']['bucket']['name'], obj['key'])
+        sequencer = sequencer_key(obj['sequencer'])
+        now = time.monotonic()
+        with self.lock:
+            self.checked += 1
+            self._evict(now)  # expired entries must not suppress this event
+            previous = self.seen.get(key)
+            if previous and previous[0] >= sequencer:
+                if previous[0] == sequencer:
+                    self.repeated += 1
+                else:
+                    self.stale += 1
+                return False
+            self.seen.pop(key, None)
+            self.seen[key] = (sequencer, now + self.ttl_seconds)
+            # after inserting, so at most max_size entries are kept
+            self._evict(now)
+            return True
+
+    def forget(self, record):
+        obj = record['s3']['object']
+        key = (record['s3']['bucket']['name'], obj['key'])
+        with self.lock:
+            if key in self.seen and self.seen[key][0] == sequencer_key(obj.get('sequencer')):
+                del self.seen[key]
+
+    def filter(self, records):
+        return [record for record in records if 's3' not in record or self.check(record)]
+
+    def stats(self):
+        with self.lock:
+            dropped = self.repeated + self.stale
+            return {
+                'checked': self.checked,
+                'repeated': self.repeated,
+                'stale': self.stale,
+                'hit_rate': dropped / self.checked if self.checked else 0.0,
+                'tracked': len(self.seen),
+            }
+
+
+class QueueConsumer:
+
+    def __init__(
+        self, queue_url, wait_seconds=20, max_messages=10, visibility_timeout=None, dedup=None, client=None,
+    ):
+        self.queue_url = queue_url
+        self.dedup = dedup
+        self.wait_seconds = wait_seconds
+        self.max_messages = min(max_messages, 10)
+        self.visibility_timeout = visibility_timeout
+        self.client = client or aws_clients.client('sqs')
+        self.receives = 0
+        self.empty_receives = 0
+        self.messages = 0
+        self.records = 0
+        self.failed = 0
+        self.errors = deque(maxlen=100)  # most recent (message id, error)
+        self.start = time.perf_counter()
+
+    def receive(self, max_messages=None, wait_seconds=None):
+        kwargs = {
+            'QueueUrl': self.queue_url,
+            'MaxNumberOfMessages': min(max_messages or self.max_messages, 10),
+            'WaitTimeSeconds': self.wait_seconds if wait_seconds is None else wait_seconds,
+        }
+        if self.visibility_timeout is not None:
+            kwargs['VisibilityTimeout'] = self.visibility_timeout
+        messages = self.client.receive_message(**kwargs).get('Messages', [])
+        self.receives += 1
+        self.empty_receives += not messages
+        self.messages += len(messages)
+        return messages
+
+    def delete(self, messages):
+        """Delete messages in batches of 10, returns the ones that failed."""
+        failed = []
+        for i in range(0, len(messages), 10):
+            batch = messages[i:i + 10]
+            response = self.client.delete_message_batch(QueueUrl=self.queue_url, Entries=[
+                {'Id': str(n), 'ReceiptHandle': m['ReceiptHandle']} for n, m in enumerate(batch)
+            ])
+            failed.extend(batch[int(f['Id'])] for f in response.get('Failed', []))
+        return failed
+
+    def process(self, messages, handler):
+        # a message is acknowledged only when every one of its records was handled
+        done = []
+        for message in messages:
+            records = self.filter(iter_records(message['Body']))
+            try:
+                for record in records:
+                    handler(record)
+                    self.records += 1
+            except Exception as e:
+                self.failed += 1
+                self.forget(records)
+                self.errors.append((message['MessageId'], e))
+            else:
+                done.append(message)
+        if done:
+            self.delete(done)
+        return done
+
+    def filter(self, records):
+        return self.dedup.filter(records) if self.dedup else list(records)
+
+    def forget(self, records):
+        if self.dedup:
+            for record in records:
+                if 's3' in record:
+                    self.dedup.forget(record)
+
+    def drain(self, handler, max_empty_receives=1):
+        """Receive and handle until `max_empty_receives` receives in a row come back empty."""
+        empty = 0
+        while empty < max_empty_receives:
+            messages = self.receive()
+            if not messages:
+                empty += 1
+                continue
+            empty = 0
+            self.process(messages, handler)
+        return self.stats()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            'receives': self.receives,
+            'empty_receives': self.empty_receives,
+            'messages': self.messages,
+            'records': self.records,
+            'failed': self.failed,
+            'errors': [(message_id, repr(e)) for message_id, e in self.errors],
+            'seconds': elapsed,
+            'messages_per_sec': self.messages / elapsed if elapsed else 0.0,
+            'dedup': self.dedup.stats() if self.dedup else None,
+        }
+
+
+def get_keys(queue_url, wait_seconds=20):
+    """Keys of every record in one long poll receive, the messages are deleted."""
+    keys = []
+    consumer = QueueConsumer(queue_url, wait_seconds=wait_seconds)
+    consumer.process(consumer.receive(), lambda record: keys.append(record_key(record)))
+    return keys
+
+
+# --- WORKER POOL ---
+
+# process messages in parallel on threads or processes while a heartbeat
+# keeps extending the visibility timeout of everything still in flight
+
+
+def handle_records(handler, records):
+    # module level so it can be sent to a process pool
+    for record in records:
+        handler(record)
+    return len(records)
+
+
+class QueueWorkerPool:
+    """Run `handler(record)` for queued S3 events on a pool of workers.
+
+    Up to `concurrency` messages are processed at once with another
+    `prefetch` received and waiting. A heartbeat thread extends the
+    visibility timeout of in-flight messages every `heartbeat_interval`
+    seconds so slow objects are not redelivered. With processes the handler
+    must be picklable.
+    """
+
+    def __init__(
+        self,
+        queue_url,
+        handler,
+        concurrency=8,
+        prefetch=10,
+        use_processes=False,
+        visibility_timeout=60,
+        heartbeat_interval=None,
+        wait_seconds=20,
+        dedup=None,
+        client=None,
+    ):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+        self.use_processes = use_processes
+        self.visibility_timeout = visibility_timeout
+        self.heartbeat_interval = heartbeat_interval or visibility_timeout / 3
+        self.consumer = QueueConsumer(
+            queue_url, wait_seconds=wait_seconds, visibility_timeout=visibility_timeout,
+            dedup=dedup, client=client,
+        )
+        self.lock = threading.Lock()
+        self.in_flight = {}  # future -> message
+        self.in_flight_records = {}  # future -> records
+        self.stopping = threading.Event()
+        self.drain = True
+        self.extended = 0
+        self.heartbeat_errors = 0
+
+    def stop(self, drain=True):
+        """Stop receiving; with drain finish and acknowledge in-flight messages, else release them."""
+        self.drain = drain
+        self.stopping.set()
+
+    def _heartbeat(self, done):
+        while not done.wait(self.heartbeat_interval):
+            with self.lock:
+                messages = list(self.in_flight.values())
+            for i in range(0, len(messages), 10):
+                try:
+                    self.extended += self._change_visibility(messages[i:i + 10], self.visibility_timeout)
+                except Exception as e:
+                    # the next beat tries again, until then the messages may be redelivered
+                    self.heartbeat_errors += 1
+                    self.consumer.errors.append((None, e))
+
+    def _change_visibility(self, messages, timeout):
+        response = self.consumer.client.change_message_visibility_batch(
+            QueueUrl=self.consumer.queue_url,
+            Entries=[
+                {'Id': str(n), 'ReceiptHandle': m['ReceiptHandle'], 'VisibilityTimeout': timeout}
+                for n, m in enumerate(messages)
+            ],
+        )
+        return len(messages) - len(response.get('Failed', []))
+
+    def _collect(self, futures):
+        done = []
+        for future in futures:
+            with self.lock:
+                message = self.in_flight.pop(future)
+                records = self.in_flight_records.pop(future)
+            try:
+                self.consumer.records += future.result()
+            except Exception as e:
+                # left in the queue, redelivered after the visibility timeout
+                self.consumer.failed += 1
+                self.consumer.forget(records)
+                self.consumer.errors.append((message['MessageId'], e))
+            else:
+                done.append(message)
+        if done:
+            self.consumer.delete(done)
+
+    def run(self, max_empty_receives=None):
+        """Process until stop() is called, or after `max_empty_receives` empty receives in a row."""
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        heartbeat_done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(heartbeat_done,), daemon=True)
+        heartbeat.start()
+        empty = 0
+        try:
+            with executor_class(max_workers=self.concurrency) as executor:
+                while not self.stopping.is_set():
+                    room = self.concurrency + self.prefetch - len(self.in_flight)
+                    if room <= 0:
+                        finished, _ = wait(list(self.in_flight), return_when=FIRST_COMPLETED)
+                        self._collect(finished)
+                        continue
+                    # long poll only when idle, otherwise finished work would wait
+                    # up to wait_seconds to be acknowledged and stop() to be seen
+                    wait_seconds = min(1, self.consumer.wait_seconds) if self.in_flight else None
+                    messages = self.consumer.receive(max_messages=room, wait_seconds=wait_seconds)
+                    if not messages:
+                        # only full long polls with nothing in flight count as idle
+                        empty += wait_seconds is None
+                        if max_empty_receives and empty >= max_empty_receives:
+                            break
+                    else:
+                        empty = 0
+                    acked = []
+                    for message in messages:
+                        # duplicates are dropped here, before a worker fetches anything
+                        records = self.consumer.filter(iter_records(message['Body']))
+                        if not records:
+                            acked.append(message)
+                            continue
+                        future = executor.submit(handle_records, self.handler, records)
+                        with self.lock:
+                            self.in_flight[future] = message
+                            self.in_flight_records[future] = records
+                    if acked:
+                        self.consumer.delete(acked)
+                    finished = [future for future in list(self.in_flight) if future.done()]
+                    self._collect(finished)
+
+                if not self.drain:
+                    # hand not yet started messages straight back to the queue
+                    pending = [f for f in list(self.in_flight) if f.cancel()]
+                    with self.lock:
+                        released = [self.in_flight.pop(f) for f in pending]
+                        for f in pending:
+                            self.consumer.forget(self.in_flight_records.pop(f))
+                    for i in range(0, len(released), 10):
+                        self._change_visibility(released[i:i + 10], 0)
+                self._collect(wait(list(self.in_flight)).done)
+        finally:
+            heartbeat_done.set()
+            heartbeat.join()
+        return self.stats()
+
+    def stats(self):
+        stats = self.consumer.stats()
+        stats['in_flight'] = len(self.in_flight)
+        stats['visibility_extended'] = self.extended
+        stats['heartbeat_errors'] = self.heartbeat_errors
+        return stats
+
+
+# --- PRODUCER ---
+
+# buffer messages and send them with send_message_batch, a batch holds at
+# most 10 entries and 256 KB in total
+
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+
+def message_size(body, attributes=None):
+    size = len(body.encode())
+    for name, value in (attributes or {}).items():
+        size += len(name.encode()) + len(value['DataType'].encode())
+        size += len(value.get('StringValue', '').encode()) + len(value.get('BinaryValue', b''))
+    return size
+
+
+class QueueProducer:
+    """Buffered producer, flushes on a full batch or after `linger_seconds`.
+
+    Only the entries that failed in a batch are retried, up to
+    `max_retries` times with backoff, a request that raises is retried
+    whole. Entries the service rejects as the sender's fault, and entries
+    still unsent after the retries, end up in `failed`.
+    """
+
+    def __init__(self, queue_url, linger_seconds=0.05, max_retries=3, client=None):
+        self.queue_url = queue_url
+        self.linger_seconds = linger_seconds
+        self.max_retries = max_retries
+        self.client = client or aws_clients.client('sqs')
+        self.lock = threading.RLock()
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.oldest = None
+        self.next_id = 0
+        self.messages = 0
+        self.requests = 0
+        self.failed = []
+        self.closed = threading.Event()
+        self.timer = threading.Thread(target=self._linger, daemon=True)
+        self.timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def send(self, body, attributes=None):
+        size = message_size(body, attributes)
+        if size > MAX_BATCH_BYTES:
+            raise ValueError(f'message of {size} bytes is over the {MAX_BATCH_BYTES} byte limit')
+        entry = {'MessageBody': body}
+        if attributes:
+            entry['MessageAttributes'] = attributes
+        batches = []
+        with self.lock:
+            if self.buffer_bytes + size > MAX_BATCH_BYTES:
+                batches.append(self._take())
+            entry['Id'] = str(self.next_id)
+            self.next_id += 1
+            self.buffer.append((entry, size))
+            self.buffer_bytes += size
+            self.oldest = self.oldest or time.monotonic()
+            if len(self.buffer) >= MAX_BATCH_ENTRIES:
+                batches.append(self._take())
+        # sent outside the lock so other senders keep buffering meanwhile
+        for entries in batches:
+            self._send_batch(entries)
+
+    def _take(self):
+        entries = [entry for entry, _ in self.buffer]
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.oldest = None
+        return entries
+
+    def _linger(self):
+        while not self.closed.wait(self.linger_seconds / 2):
+            with self.lock:
+                due = self.oldest and time.monotonic() - self.oldest >= self.linger_seconds
+                entries = self._take() if due else []
+            self._send_batch(entries)
+
+    def flush(self):
+        with self.lock:
+            entries = self._take()
+        self._send_batch(entries)
+
+    def _send_batch(self, entries):
+        # never raises, entries that can not be sent end up in self.failed
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if not entries:
+                return
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 2.0))
+            try:
+                response = self.client.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            except Exception as e:
+                error = {'Code': type(e).__name__, 'Message': str(e)}
+                continue
+            by_id = {entry['Id']: entry for entry in entries}
+            retry = []
+            with self.lock:
+                self.requests += 1
+                self.messages += len(response.get('Successful', []))
+                for failure in response.get('Failed', []):
+                    if failure.get('SenderFault'):
+                        self.failed.append((by_id[failure['Id']], failure))
+                    else:
+                        retry.append(by_id[failure['Id']])
+            entries = retry
+            error = {'Code': 'RetriesExhausted'}
+        with self.lock:
+            self.failed.extend((entry, error) for entry in entries)
+
+    def close(self):
+        self.closed.set()
+        self.timer.join()
+        self.flush()
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'requests': self.requests,
+            'failed': len(self.failed),
+            'messages_per_request': self.messages / self.requests if self.requests else 0.0,
+        }
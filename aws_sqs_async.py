@@ -0,0 +1,257 @@
+"""asyncio S3 -> SQS pipeline
+
+asyncio version of the aws_sdk_s3_sqs.py flow. Receiving from the queue,
+fetching the referenced S3 object and processing it run as separate stages
+connected by bounded queues, so a slow stage backs up the ones before it
+and thousands of objects can be in flight from one process. A heartbeat
+keeps extending the visibility timeout of messages still waiting.
+
+Needs aiobotocore, which is imported on first use.
+
+    stats = asyncio.run(aws_sqs_async.run_pipeline(queue_url, process))
+"""
+
+import asyncio
+import inspect
+import time
+from collections import deque
+
+import aws_sqs
+
+DONE = object()
+
+
+class Pipeline:
+
+    def __init__(
+        self,
+        queue_url,
+        process,
+        receivers=2,
+        fetchers=64,
+        processors=8,
+        queue_size=256,
+        wait_seconds=20,
+        visibility_timeout=60,
+        heartbeat_interval=None,
+        max_empty_receives=1,
+        dedup=None,
+    ):
+        self.queue_url = queue_url
+        self.process = process
+        self.receivers = receivers
+        self.fetchers = fetchers
+        self.processors = processors
+        self.wait_seconds = wait_seconds
+        self.visibility_timeout = visibility_timeout
+        # without a visibility timeout of our own there is nothing to extend to
+        self.heartbeat_interval = heartbeat_interval or (visibility_timeout and visibility_timeout / 3)
+        self.max_empty_receives = max_empty_receives
+        self.dedup = dedup
+        self.records = asyncio.Queue(maxsize=queue_size)
+        self.objects = asyncio.Queue(maxsize=queue_size)
+        self.acks = asyncio.Queue(maxsize=queue_size)
+        self.remaining = {}  # message id -> records not yet processed
+        self.in_flight = {}  # message id -> message, kept visible by the heartbeat
+        self.stopping = asyncio.Event()
+        self.errors = deque(maxlen=100)  # most recent (message id, error)
+        self.counts = {
+            'messages': 0, 'records': 0, 'bytes': 0, 'failed': 0, 'deleted': 0, 'delete_errors': 0,
+            'visibility_extended': 0, 'heartbeat_errors': 0,
+        }
+        self.start = time.perf_counter()
+
+    def stop(self):
+        self.stopping.set()
+
+    # --- STAGES ---
+
+    async def receive(self, sqs):
+        empty = 0
+        while not self.stopping.is_set():
+            kwargs = {
+                'QueueUrl': self.queue_url,
+                'MaxNumberOfMessages': 10,
+                'WaitTimeSeconds': self.wait_seconds,
+            }
+            if self.visibility_timeout is not None:
+                kwargs['VisibilityTimeout'] = self.visibility_timeout
+            response = await sqs.receive_message(**kwargs)
+            messages = response.get('Messages', [])
+            if not messages:
+                empty += 1
+                if self.max_empty_receives and empty >= self.max_empty_receives:
+                    return
+                continue
+            empty = 0
+            self.counts['messages'] += len(messages)
+            for message in messages:
+                records = list(aws_sqs.iter_records(message['Body']))
+                if self.dedup:
+                    # dropped before the fetch stage issues a GET
+                    records = self.dedup.filter(records)
+                if not records:
+                    await self.acks.put(message)
+                    continue
+                self.remaining[message['MessageId']] = len(records)
+                self.in_flight[message['MessageId']] = message
+                for record in records:
+                    await self.records.put((message, record))
+
+    async def fetch(self, s3):
+        while True:
+            item = await self.records.get()
+            if item is DONE:
+                return
+            message, record = item
+            try:
+                response = await s3.get_object(
+                    Bucket=record['s3']['bucket']['name'], Key=aws_sqs.record_key(record),
+                )
+                async with response['Body'] as body:
+                    data = await body.read()
+            except Exception as e:
+                self._fail(message, record, e)
+                continue
+            await self.objects.put((message, record, data))
+
+    async def run_process(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.objects.get()
+            if item is DONE:
+                return
+            message, record, data = item
+            try:
+                if inspect.iscoroutinefunction(self.process):
+                    await self.process(record, data)
+                else:
+                    # plain functions run off the event loop
+                    await loop.run_in_executor(None, self.process, record, data)
+            except Exception as e:
+                self._fail(message, record, e)
+                continue
+            self.counts['records'] += 1
+            self.counts['bytes'] += len(data)
+            message_id = message['MessageId']
+            if message_id in self.remaining:
+                self.remaining[message_id] -= 1
+                if not self.remaining[message_id]:
+                    del self.remaining[message_id]
+                    del self.in_flight[message_id]
+                    await self.acks.put(message)
+
+    def _fail(self, message, record, error):
+        # a failed record leaves its message unacknowledged so it is redelivered
+        self.errors.append((message['MessageId'], error))
+        if self.dedup:
+            self.dedup.forget(record)
+        self.counts['failed'] += 1
+        self.remaining.pop(message['MessageId'], None)
+        self.in_flight.pop(message['MessageId'], None)
+
+    async def ack(self, sqs):
+        batch = []
+        done = False
+        getter = None
+        while not done:
+            # asyncio.wait rather than wait_for, which can swallow a cancel
+            # arriving together with an item, the pending get carries over
+            getter = getter or asyncio.ensure_future(self.acks.get())
+            try:
+                await asyncio.wait({getter}, timeout=0.1)
+            except asyncio.CancelledError:
+                getter.cancel()
+                raise
+            item = None
+            if getter.done():
+                item = getter.result()
+                getter = None
+            if item is DONE:
+                done = True
+            elif item is not None:
+                batch.append(item)
+            if batch and (len(batch) >= 10 or item is None or done):
+                await self._delete(sqs, batch)
+                batch = []
+
+    async def _delete(self, sqs, batch):
+        # messages that fail to delete are redelivered, so count and go on
+        try:
+            response = await sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=[
+                {'Id': str(n), 'ReceiptHandle': m['ReceiptHandle']} for n, m in enumerate(batch)
+            ])
+        except Exception:
+            self.counts['delete_errors'] += len(batch)
+            return
+        self.counts['deleted'] += len(response.get('Successful', []))
+        self.counts['delete_errors'] += len(response.get('Failed', []))
+
+    async def heartbeat(self, sqs):
+        # messages can wait behind backpressure for longer than their
+        # visibility timeout, extend it until they are acknowledged or fail
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            messages = list(self.in_flight.values())
+            for i in range(0, len(messages), 10):
+                batch = messages[i:i + 10]
+                try:
+                    response = await sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=[
+                        {'Id': str(n), 'ReceiptHandle': m['ReceiptHandle'], 'VisibilityTimeout': self.visibility_timeout}
+                        for n, m in enumerate(batch)
+                    ])
+                except Exception as e:
+                    # the next beat tries again, until then the messages may be redelivered
+                    self.counts['heartbeat_errors'] += 1
+                    self.errors.append((None, e))
+                    continue
+                self.counts['visibility_extended'] += len(batch) - len(response.get('Failed', []))
+
+    # --- RUN ---
+
+    async def run(self, session=None):
+        if session is None:
+            from aiobotocore.session import get_session
+            session = get_session()
+
+        async with session.create_client('sqs') as sqs, session.create_client('s3') as s3:
+            receivers = [asyncio.create_task(self.receive(sqs)) for _ in range(self.receivers)]
+            fetchers = [asyncio.create_task(self.fetch(s3)) for _ in range(self.fetchers)]
+            processors = [asyncio.create_task(self.run_process()) for _ in range(self.processors)]
+            acker = asyncio.create_task(self.ack(sqs))
+            tasks = receivers + fetchers + processors + [acker]
+            if self.heartbeat_interval:
+                tasks.append(asyncio.create_task(self.heartbeat(sqs)))
+
+            try:
+                # shut down stage by stage so everything received gets processed
+                await asyncio.gather(*receivers)
+                for _ in fetchers:
+                    await self.records.put(DONE)
+                await asyncio.gather(*fetchers)
+                for _ in processors:
+                    await self.objects.put(DONE)
+                await asyncio.gather(*processors)
+                await self.acks.put(DONE)
+                await acker
+            finally:
+                # on an error no stage may outlive the clients
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        return self.stats()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start
+        stats = dict(self.counts)
+        stats['seconds'] = elapsed
+        stats['records_per_sec'] = self.counts['records'] / elapsed if elapsed else 0.0
+        stats['errors'] = [(message_id, repr(e)) for message_id, e in self.errors]
+        stats['dedup'] = self.dedup.stats() if self.dedup else None
+        return stats
+
+
+async def run_pipeline(queue_url, process, session=None, **kwargs):
+    """Drain queue_url, calling process(record, data) for every S3 object referenced."""
+    return await Pipeline(queue_url, process, **kwargs).run(session)
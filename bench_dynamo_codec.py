@@ -0,0 +1,126 @@
+"""Benchmark: aws_dynamo_codec vs boto3 TypeSerializer/TypeDeserializer
+
+Encodes and decodes items shaped like the ones in aws_sdk_dynamo.py with
+the fast codec and with the serializers the resource layer runs every item
+through (including the float <-> Decimal conversion it needs). Before
+timing, every item is checked to round trip through both and to produce
+the same wire format; test_aws_dynamo_codec.py covers the other types.
+
+    python bench_dynamo_codec.py --items 20000 --repeat 5
+"""
+
+import argparse
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import aws_dynamo_codec
+
+
+def make_items(count):
+    return [
+        {
+            'key': i,
+            'text': str(i),
+            'stuff': {
+                'message': 'hello',
+                'score': i / 7,
+                'active': i % 2 == 0,
+                'tags': ['a', 'b', str(i % 10)],
+                'nested': {'depth': 2, 'values': [1, 2.5, None]},
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def to_decimal(value):
+    # the resource layer rejects floats, callers convert them first
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    if isinstance(value, dict):
+        return {k: to_decimal(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_decimal(v) for v in value]
+    return value
+
+
+def from_decimal(value):
+    if isinstance(value, Decimal):
+        return aws_dynamo_codec.parse_number(str(value))
+    if isinstance(value, dict):
+        return {k: from_decimal(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [from_decimal(v) for v in value]
+    return value
+
+
+def boto3_encode(items):
+    serializer = TypeSerializer()
+    return [{k: serializer.serialize(v) for k, v in to_decimal(item).items()} for item in items]
+
+
+def boto3_decode(wire_items):
+    deserializer = TypeDeserializer()
+    return [from_decimal({k: deserializer.deserialize(v) for k, v in item.items()}) for item in wire_items]
+
+
+def codec_encode(items):
+    return [aws_dynamo_codec.encode_item(item) for item in items]
+
+
+def codec_decode(wire_items):
+    return [aws_dynamo_codec.decode_item(item) for item in wire_items]
+
+
+def check(items):
+    # raised explicitly so the checks also run under python -O
+    wire = codec_encode(items)
+    deserializer = TypeDeserializer()
+    exact = [aws_dynamo_codec.decode_item(item, number=Decimal) for item in wire]
+    for ok, message in (
+        (wire == boto3_encode(items), 'codec and TypeSerializer disagree'),
+        (codec_decode(wire) == items, 'codec round trip failed'),
+        (boto3_decode(wire) == items, 'TypeDeserializer reads codec output differently'),
+        (exact == [{k: deserializer.deserialize(v) for k, v in item.items()} for item in wire],
+         'exact decode differs from TypeDeserializer'),
+    ):
+        if not ok:
+            raise AssertionError(message)
+
+
+def best_of(function, data, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    check(items)
+    wire = codec_encode(items)
+
+    for name, boto3_function, codec_function, data in (
+        ('encode', boto3_encode, codec_encode, items),
+        ('decode', boto3_decode, codec_decode, wire),
+    ):
+        boto3_seconds = best_of(boto3_function, data, args.repeat)
+        codec_seconds = best_of(codec_function, data, args.repeat)
+        print(
+            f'{name}  boto3 {args.items / boto3_seconds:10.0f} items/s  '
+            f'codec {args.items / codec_seconds:10.0f} items/s  '
+            f'{boto3_seconds / codec_seconds:5.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
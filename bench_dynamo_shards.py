@@ -0,0 +1,119 @@
+"""Benchmark: write sharding for hot partition keys
+
+Writes a skewed workload, most items landing on a few hot logical keys,
+through aws_dynamo.ShardedTable once without sharding and once with the
+hot keys split into shards. The table is a local stand-in for DynamoDB that
+gives every physical partition key a fixed write rate and returns anything
+above it as UnprocessedItems, the way a throttled hot partition does.
+Afterwards every hot key is read back with a scatter-gather query and
+checked against what was written.
+
+    python bench_dynamo_shards.py --items 20000 --hot-keys 3 --shards 10
+"""
+
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+
+import aws_dynamo
+
+
+class PartitionedTable:
+    """In-memory key/text table with a write rate limit per partition key."""
+
+    def __init__(self, partition_rate):
+        self.partition_rate = partition_rate
+        self.lock = threading.Lock()
+        self.items = defaultdict(dict)  # key -> text -> item
+        self.windows = {}  # key -> (second, writes)
+        self.throttled = 0
+
+    def _admit(self, key, now):
+        second, writes = self.windows.get(key, (int(now), 0))
+        if second != int(now):
+            second, writes = int(now), 0
+        if writes >= self.partition_rate:
+            return False
+        self.windows[key] = (second, writes + 1)
+        return True
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        unprocessed = {}
+        now = time.monotonic()
+        with self.lock:
+            for table_name, requests in RequestItems.items():
+                for request in requests:
+                    item = request.get('PutRequest', {}).get('Item') or request['DeleteRequest']['Key']
+                    if not self._admit(item['key'], now):
+                        self.throttled += 1
+                        unprocessed.setdefault(table_name, []).append(request)
+                    elif 'PutRequest' in request:
+                        self.items[item['key']][item['text']] = item
+                    else:
+                        self.items[item['key']].pop(item['text'], None)
+        return {'UnprocessedItems': unprocessed}
+
+    def query(self, ExpressionAttributeValues, Limit, ExclusiveStartKey=None, **kwargs):
+        key = ExpressionAttributeValues[':key']
+        with self.lock:
+            texts = sorted(self.items[key])
+        if ExclusiveStartKey:
+            texts = [text for text in texts if text > ExclusiveStartKey['text']]
+        page = [self.items[key][text] for text in texts[:Limit]]
+        response = {'Items': page}
+        if len(texts) > Limit:
+            response['LastEvaluatedKey'] = {'key': key, 'text': page[-1]['text']}
+        return response
+
+
+def make_items(count, hot_keys, hot_share, cold_keys):
+    items = []
+    for i in range(count):
+        if random.random() < hot_share:
+            key = random.randrange(hot_keys)
+        else:
+            key = hot_keys + random.randrange(cold_keys)
+        items.append({'key': key, 'text': f'{i:08d}', 'stuff': {'message': 'hello'}})
+    return items
+
+
+def run(items, shards, args):
+    table = PartitionedTable(args.partition_rate)
+    sharded = aws_dynamo.ShardedTable('bench_shards', shards=shards, client=table)
+    result = sharded.batch_write(puts=items, max_workers=args.workers, max_retries=args.max_retries)
+    for key in range(args.hot_keys):
+        expected = sorted(item['text'] for item in items if item['key'] == key)
+        found = [item['text'] for item in sharded.query(key, page_size=500)]
+        assert found == expected, f'key {key}: read {len(found)} of {len(expected)} items'
+    return result, table.throttled
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--hot-keys', type=int, default=3)
+    parser.add_argument('--hot-share', type=float, default=0.8)
+    parser.add_argument('--cold-keys', type=int, default=1000)
+    parser.add_argument('--shards', type=int, default=10)
+    parser.add_argument('--partition-rate', type=int, default=1000, help='writes per second per partition key')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--max-retries', type=int, default=30)
+    args = parser.parse_args()
+
+    random.seed(0)
+    items = make_items(args.items, args.hot_keys, args.hot_share, args.cold_keys)
+    for name, shards in (
+        ('unsharded', {}),
+        (f'{args.shards} shards', {key: args.shards for key in range(args.hot_keys)}),
+    ):
+        result, throttled = run(items, shards, args)
+        print(
+            f'{name:<12} {result["seconds"]:7.2f}s {result["items_per_sec"]:10.0f} items/s  '
+            f'throttled {throttled:7d}  unprocessed {len(result["unprocessed"])}'
+        )
+
+
+if __name__ == '__main__':
+    main()
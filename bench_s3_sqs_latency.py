@@ -0,0 +1,141 @@
+"""Benchmark: upload -> notification -> processed latency
+
+Uploads N objects of a given size in parallel to a local S3 + SQS stand-in
+(moto) with ObjectCreated notifications to a queue, as set up in
+aws_sdk_s3_sqs.py, while consumers drain the queue and process each object.
+Reports p50/p95/p99 latency from the start of the PUT to message receipt and
+to processing completion, and writes the results as json.
+
+    python bench_s3_sqs_latency.py --objects 500 --size-kb 64 --output latency.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from moto import mock_aws  # noqa: E402
+
+import aws_clients  # noqa: E402
+import aws_s3  # noqa: E402
+import aws_sqs  # noqa: E402
+
+BUCKET = 'bench-latency'
+QUEUE = 'bench_latency'
+
+
+def summarize(latencies):
+    values = list(latencies)
+    return {
+        'count': len(values),
+        'p50_ms': aws_s3.percentile(values, 50) * 1000,
+        'p95_ms': aws_s3.percentile(values, 95) * 1000,
+        'p99_ms': aws_s3.percentile(values, 99) * 1000,
+        'max_ms': max(values, default=0.0) * 1000,
+    }
+
+
+class Tracker:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.put_start = {}
+        self.put_done = {}
+        self.received = {}
+        self.processed = {}
+
+    def mark(self, stage, key):
+        now = time.perf_counter()
+        with self.lock:
+            getattr(self, stage).setdefault(key, now)
+
+    def latencies(self, stage):
+        with self.lock:
+            end = getattr(self, stage)
+            return [end[key] - self.put_start[key] for key in end if key in self.put_start]
+
+
+def consume(queue_url, tracker, expected, deadline):
+    consumer = aws_sqs.QueueConsumer(queue_url, wait_seconds=1)
+    s3_client = aws_clients.client('s3')
+
+    def handler(record):
+        key = aws_sqs.record_key(record)
+        data = s3_client.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+        data.upper()
+        tracker.mark('processed', key)
+
+    while len(tracker.processed) < expected and time.perf_counter() < deadline:
+        messages = consumer.receive()
+        for message in messages:
+            for record in aws_sqs.iter_records(message['Body']):
+                tracker.mark('received', aws_sqs.record_key(record))
+        consumer.process(messages, handler)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', type=int, default=500)
+    parser.add_argument('--size-kb', type=int, default=64)
+    parser.add_argument('--uploaders', type=int, default=16)
+    parser.add_argument('--consumers', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', default='latency.json')
+    args = parser.parse_args()
+
+    with mock_aws():
+        aws_clients.clear()
+        aws_clients.client('s3').create_bucket(Bucket=BUCKET)
+        queue_url, queue_arn = aws_sqs.create_queue(QUEUE)
+        aws_sqs.allow_bucket(queue_url, queue_arn, BUCKET)
+        aws_sqs.notify_queue(BUCKET, queue_arn)
+        aws_sqs.QueueConsumer(queue_url, wait_seconds=1).drain(lambda record: None)  # s3:TestEvent
+
+        tracker = Tracker()
+        data = os.urandom(args.size_kb * 1024)
+        deadline = time.perf_counter() + args.timeout
+        consumers = [
+            threading.Thread(target=consume, args=(queue_url, tracker, args.objects, deadline))
+            for _ in range(args.consumers)
+        ]
+        for thread in consumers:
+            thread.start()
+
+        def upload(i):
+            key = f'obj_{i:06d}'
+            tracker.mark('put_start', key)
+            aws_s3.put_bytes(BUCKET, key, data)
+            tracker.mark('put_done', key)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.uploaders) as pool:
+            list(pool.map(upload, range(args.objects)))
+        for thread in consumers:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': vars(args),
+        'seconds': seconds,
+        'objects_per_sec': len(tracker.processed) / seconds if seconds else 0.0,
+        'put': summarize(tracker.latencies('put_done')),
+        'receipt': summarize(tracker.latencies('received')),
+        'processed': summarize(tracker.latencies('processed')),
+        'lost': args.objects - len(tracker.processed),
+    }
+    print(json.dumps(results, indent=2))
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark: read-all transform vs aws_s3.transform_object
+
+Uses a synthetic in-process S3 stand-in that generates the object body on
+the fly and discards uploaded parts, so multi-GB objects can be pushed
+through the pipeline and peak Python memory reflects the pipeline alone.
+
+    python bench_s3_stream.py --size-mb 4096
+    python bench_s3_stream.py --size-mb 512 --baseline
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import aws_s3  # noqa: E402
+
+MB = 1024 ** 2
+
+
+class SyntheticBody:
+
+    def __init__(self, size):
+        self.size = size
+        self.block = b'hello world ' * (MB // 12)
+
+    def iter_chunks(self, chunk_size):
+        remaining = self.size
+        while remaining:
+            n = min(chunk_size, remaining)
+            yield (self.block * (n // len(self.block) + 1))[:n]
+            remaining -= n
+
+    def read(self):
+        return b''.join(self.iter_chunks(MB))
+
+    def close(self):
+        pass
+
+
+class SyntheticS3:
+
+    def __init__(self, size):
+        self.size = size
+        self.bytes_written = 0
+
+    def get_object(self, Bucket, Key):
+        return {'Body': SyntheticBody(self.size)}
+
+    def put_object(self, Bucket, Key, Body):
+        self.bytes_written += len(Body)
+
+    def create_multipart_upload(self, Bucket, Key):
+        return {'UploadId': 'bench'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.bytes_written += len(Body)
+        return {'ETag': f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, **kwargs):
+        pass
+
+    def abort_multipart_upload(self, **kwargs):
+        pass
+
+
+def run(name, func, client):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<12} {seconds:8.2f}s {client.bytes_written / MB / seconds:10.1f} MB/s '
+          f'peak {peak / MB:10.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--part-mb', type=int, default=8)
+    parser.add_argument('--read-mb', type=int, default=1)
+    parser.add_argument('--baseline', action='store_true', help='also run the read-all path')
+    args = parser.parse_args()
+    size = args.size_mb * MB
+
+    if args.baseline:
+        client = SyntheticS3(size)
+
+        def read_all():
+            text = client.get_object(Bucket='bench', Key='obj')['Body'].read()
+            client.put_object(Bucket='bench', Key='obj', Body=text.upper())
+
+        run('read-all', read_all, client)
+
+    client = SyntheticS3(size)
+    run('streaming', lambda: aws_s3.transform_object(
+        'bench', 'obj', bytes.upper,
+        read_size=args.read_mb * MB,
+        part_size=args.part_mb * MB,
+        client=client,
+    ), client)
+
+
+if __name__ == '__main__':
+    main()
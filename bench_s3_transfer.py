@@ -0,0 +1,86 @@
+"""Benchmark: serial upload_file/download_file vs aws_s3.TransferEngine
+
+Runs against moto's in-process S3 so no AWS account is needed.
+
+    python bench_s3_transfer.py --objects 20 --size-mb 16
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from moto import mock_aws  # noqa: E402
+
+MB = 1024 ** 2
+
+
+def make_files(folder, count, size):
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f'obj_{i}.bin')
+        with open(path, 'wb') as file:
+            file.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def report(name, count, size, seconds):
+    mb = count * size / MB
+    print(f'{name:<24} {seconds:8.2f}s {mb / seconds:10.1f} MB/s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', type=int, default=20)
+    parser.add_argument('--size-mb', type=int, default=16)
+    parser.add_argument('--part-mb', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    size = args.size_mb * MB
+
+    with mock_aws(), tempfile.TemporaryDirectory() as folder:
+        import boto3
+        import aws_s3
+
+        bucket_name = 'bench-transfer'
+        s3_client = boto3.client('s3')
+        s3_client.create_bucket(Bucket=bucket_name)
+        paths = make_files(folder, args.objects, size)
+
+        # serial baseline, default transfer settings
+        start = time.perf_counter()
+        for path in paths:
+            s3_client.upload_file(path, bucket_name, os.path.basename(path))
+        report('serial upload', len(paths), size, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for path in paths:
+            s3_client.download_file(bucket_name, os.path.basename(path), path + '.out')
+        report('serial download', len(paths), size, time.perf_counter() - start)
+
+        # transfer engine
+        with aws_s3.TransferEngine(
+            part_size=args.part_mb * MB,
+            max_concurrency=args.concurrency,
+            max_workers=args.workers,
+        ) as engine:
+            start = time.perf_counter()
+            engine.upload_files([(p, bucket_name, os.path.basename(p)) for p in paths])
+            report('engine upload', len(paths), size, time.perf_counter() - start)
+            print(engine.stats.summary())
+
+            engine.reset_stats()
+            start = time.perf_counter()
+            engine.download_files([(bucket_name, os.path.basename(p), p + '.out') for p in paths])
+            report('engine download', len(paths), size, time.perf_counter() - start)
+            print(engine.stats.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark: asyncio pipeline vs thread pool for queued S3 events
+
+Starts a local moto server, uploads objects, queues one S3 style event per
+object and drains the queue once with aws_sqs_async.run_pipeline and once
+with aws_sqs.QueueWorkerPool.
+
+    python bench_sqs_async.py --objects 2000 --size-kb 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import aws_clients  # noqa: E402
+import aws_s3  # noqa: E402
+import aws_sqs  # noqa: E402
+import aws_sqs_async  # noqa: E402
+
+BUCKET = 'bench-async'
+
+
+def event_body(key):
+    return json.dumps({'Records': [{
+        'eventName': 'ObjectCreated:Put',
+        's3': {'bucket': {'name': BUCKET}, 'object': {'key': key}},
+    }]})
+
+
+def fill_queue(queue_url, keys):
+    with aws_sqs.QueueProducer(queue_url) as producer:
+        for key in keys:
+            producer.send(event_body(key))
+
+
+def process(record, data):
+    return len(data.upper())
+
+
+def run_threads(queue_url, concurrency):
+    s3_client = aws_clients.client('s3', max_pool_connections=concurrency)
+
+    def handler(record):
+        response = s3_client.get_object(Bucket=BUCKET, Key=aws_sqs.record_key(record))
+        process(record, response['Body'].read())
+
+    pool = aws_sqs.QueueWorkerPool(
+        queue_url, handler, concurrency=concurrency, prefetch=concurrency, wait_seconds=1,
+    )
+    return pool.run(max_empty_receives=2)
+
+
+def run_async(queue_url, fetchers):
+    return asyncio.run(aws_sqs_async.run_pipeline(
+        queue_url, process, fetchers=fetchers, receivers=4, wait_seconds=1, max_empty_receives=2,
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', type=int, default=2000)
+    parser.add_argument('--size-kb', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--fetchers', type=int, default=256)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=args.port)
+    server.start()
+    os.environ['AWS_ENDPOINT_URL'] = f'http://127.0.0.1:{args.port}'
+    aws_clients.clear()
+    try:
+        aws_clients.client('s3').create_bucket(Bucket=BUCKET)
+        queue_url, _ = aws_sqs.create_queue('bench_async')
+        keys = [f'obj_{i}' for i in range(args.objects)]
+        data = os.urandom(args.size_kb * 1024)
+        for key in keys:
+            aws_s3.put_bytes(BUCKET, key, data)
+
+        for name, run in (
+            ('threads', lambda: run_threads(queue_url, args.threads)),
+            ('asyncio', lambda: run_async(queue_url, args.fetchers)),
+        ):
+            fill_queue(queue_url, keys)
+            start = time.perf_counter()
+            stats = run()
+            # both runs end on two empty 1s receives, the same idle tail for each
+            seconds = time.perf_counter() - start
+            print(f'{name:<8} {seconds:8.2f}s {args.objects / seconds:10.1f} objects/s  {stats}')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: import latency of the library modules
+
+Imports each module in a fresh interpreter several times and reports the
+median wall time over a bare interpreter start, plus the slowest imports
+from -X importtime. Library modules should not pull in boto3 or pandas
+until a function needs them.
+
+    python bench_startup.py --repeat 10 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    'aws_clients',
+    'aws_parallel',
+    'aws_iam',
+    'aws_security_group',
+    'aws_s3',
+    'aws_s3_cache',
+    'aws_s3_index',
+    'aws_sqs',
+    'aws_dynamo',
+]
+
+HEAVY = ('boto3', 'botocore', 'pandas')
+
+
+def run(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start
+
+
+def slowest_imports(module, count=5):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def heavy_modules_loaded(module):
+    code = f'import sys, {module}; print(",".join(m for m in {HEAVY!r} if m in sys.modules))'
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return [m for m in result.stdout.strip().split(',') if m]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='write results as json')
+    args = parser.parse_args()
+
+    baseline = statistics.median(run('pass') for _ in range(args.repeat))
+    results = {'python': sys.version, 'baseline_s': baseline, 'modules': {}}
+    print(f'{"interpreter":<20} {baseline * 1000:8.1f} ms')
+
+    for module in MODULES:
+        seconds = statistics.median(run(f'import {module}') for _ in range(args.repeat))
+        heavy = heavy_modules_loaded(module)
+        results['modules'][module] = {
+            'import_ms': (seconds - baseline) * 1000,
+            'heavy_modules': heavy,
+            'slowest': slowest_imports(module),
+        }
+        print(f'{module:<20} {(seconds - baseline) * 1000:8.1f} ms  {",".join(heavy)}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
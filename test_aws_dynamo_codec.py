@@ -0,0 +1,117 @@
+"""Tests for aws_dynamo_codec, checked against boto3's TypeSerializer/TypeDeserializer."""
+
+import math
+from decimal import Decimal
+
+import pytest
+
+import aws_dynamo_codec
+
+ITEMS = [
+    {'key': 0, 'text': 'zero', 'stuff': {'message': 'hello word', 'response': 'oh hello'}},
+    {'key': -12345678901234567890, 'text': '', 'flag': True, 'off': False, 'none': None},
+    {'nested': {'list': [1, 'a', [2, {'deep': None}]], 'empty_map': {}, 'empty_list': []}},
+    {'decimal': Decimal('1.10'), 'tiny': Decimal('1E-130'), 'big': Decimal('9' * 38)},
+    {'binary': b'\x00\xff', 'strings': {'a', 'b'}, 'numbers': {1, Decimal('2.5')}, 'binaries': {b'x', b'y'}},
+]
+
+
+@pytest.fixture
+def serializers():
+    types = pytest.importorskip('boto3.dynamodb.types')
+    return types.TypeSerializer(), types.TypeDeserializer()
+
+
+def normalize(wire):
+    # sets have no order on the wire
+    if isinstance(wire, dict):
+        return {k: sorted(v) if k in ('SS', 'NS', 'BS') else normalize(v) for k, v in wire.items()}
+    if isinstance(wire, list):
+        return [normalize(v) for v in wire]
+    return wire
+
+
+def plain(value):
+    # TypeDeserializer wraps binary values in Binary
+    if hasattr(value, 'value') and isinstance(value.value, bytes):
+        return value.value
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    if isinstance(value, set):
+        return {plain(v) for v in value}
+    return value
+
+
+@pytest.mark.parametrize('item', ITEMS)
+def test_encode_matches_type_serializer(serializers, item):
+    serializer, _ = serializers
+    expected = {k: serializer.serialize(v) for k, v in item.items()}
+    assert normalize(aws_dynamo_codec.encode_item(item)) == normalize(expected)
+
+
+@pytest.mark.parametrize('item', ITEMS)
+def test_decode_matches_type_deserializer(serializers, item):
+    serializer, deserializer = serializers
+    wire = {k: serializer.serialize(v) for k, v in item.items()}
+    expected = plain({k: deserializer.deserialize(v) for k, v in wire.items()})
+    assert aws_dynamo_codec.decode_item(wire, number=Decimal) == expected
+
+
+@pytest.mark.parametrize('item', ITEMS)
+def test_round_trip_exact(item):
+    decoded = aws_dynamo_codec.decode_item(aws_dynamo_codec.encode_item(item), number=Decimal)
+    assert decoded == item
+
+
+def test_plain_numbers_decode_to_int_and_float():
+    item = {'i': 3, 'f': 0.1, 'e': 1e-07, 'l': [2, 2.5]}
+    assert aws_dynamo_codec.decode_item(aws_dynamo_codec.encode_item(item)) == item
+    assert type(aws_dynamo_codec.decode_item(aws_dynamo_codec.encode_item(item))['i']) is int
+
+
+def test_number_set_decodes_with_number():
+    wire = aws_dynamo_codec.encode({1, Decimal('2.50')})
+    assert aws_dynamo_codec.decode(wire, number=Decimal) == {Decimal('1'), Decimal('2.50')}
+    assert aws_dynamo_codec.decode(wire) == {1, 2.5}
+
+
+def test_bool_is_not_a_number():
+    assert aws_dynamo_codec.encode(True) == {'BOOL': True}
+    assert aws_dynamo_codec.encode(1) == {'N': '1'}
+
+
+def test_tuple_encodes_as_list():
+    assert aws_dynamo_codec.encode((1, 'a')) == aws_dynamo_codec.encode([1, 'a'])
+
+
+@pytest.mark.parametrize('value', [math.nan, math.inf, -math.inf, Decimal('NaN'), Decimal('Infinity')])
+def test_rejects_non_finite_numbers(value):
+    with pytest.raises(ValueError):
+        aws_dynamo_codec.encode(value)
+
+
+@pytest.mark.parametrize('value', [set(), frozenset()])
+def test_rejects_empty_sets(value):
+    with pytest.raises(ValueError):
+        aws_dynamo_codec.encode(value)
+
+
+@pytest.mark.parametrize('value', [{1, 'a'}, {True, False}, object()])
+def test_rejects_unsupported_values(value):
+    with pytest.raises(TypeError):
+        aws_dynamo_codec.encode(value)
+
+
+@pytest.mark.parametrize('value', [{1: 'x'}, {'a': {(1, 2): 'x'}}])
+def test_rejects_non_str_map_keys(value):
+    with pytest.raises(TypeError):
+        aws_dynamo_codec.encode(value)
+    with pytest.raises(TypeError):
+        aws_dynamo_codec.encode_item(value)
+
+
+def test_rejects_unknown_wire_type():
+    with pytest.raises(TypeError):
+        aws_dynamo_codec.decode({'X': 'a'})